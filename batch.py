@@ -0,0 +1,288 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+from __future__ import print_function
+from parse import Parse
+from corruptedFileError import CorruptedFileError
+from glyphs import getGlyph
+from renderCache import RenderCache, cacheKey, DEFAULT_CACHE_SIZE
+from instrumentation import Profile
+import argparse
+import multiprocessing
+import os
+import sys
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+'''
+    The batch mode renders many score files without the interactive menu:
+
+        main.py render <inputs...> --out-dir DIR --jobs N
+
+    Each score file is parsed and printed into the output folder, into a file
+    named after it with OUTPUT_SUFFIX in place of its extension (see
+    outputName()). The files are spread over a pool of N worker processes, a
+    chunk of files at a time. A file that can't be rendered is reported, and
+    the rest of the files are rendered normally. So is a file whose output
+    would overwrite one of the inputs or the output of another input.
+
+    With --cache-dir, the printed staves are kept in a RenderCache, so that
+    score files that haven't changed since the last run aren't parsed again.
+    The cache is trimmed to its size limit after all the files are rendered.
+
+    With --profile, each file is rendered inside a Profile, and the combined
+    statistics of all the files are printed at the end.
+'''
+
+#The number of chunks handed out to each worker process (at most), so that
+#the work stays balanced even if some files are much longer than others
+CHUNKS_PER_JOB = 4
+
+#The ending of the names of the rendered files
+OUTPUT_SUFFIX = ".render.txt"
+
+'''
+                            -outputName-
+    This function gives the name of the file a score file is rendered into.
+    For example "songs/duet.txt" is rendered into "DIR/duet.render.txt".
+
+    PARAMETERS:
+        -The name of the score file
+        -The output folder
+
+    RETURNS:
+        -The name of the rendered file
+'''
+
+def outputName(filename, out_dir):
+    name = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(out_dir, name + OUTPUT_SUFFIX)
+
+'''
+                            -renderOptions-
+    This function gives the options that affect the way the staves are
+    printed, to be used as a part of the cache key.
+
+    PARAMETERS:
+        -The number of bars in each system (None for a single system)
+
+    RETURNS:
+        -The options as a dictionary
+'''
+
+def renderOptions(barsPerSystem):
+    return {"bars_per_system": barsPerSystem,
+            "clef": getGlyph("G-cleff") is not None}
+
+'''
+                            -renderFile-
+    This function renders a single score file into the output folder
+
+    PARAMETERS:
+        -The name of the score file
+        -The folder the rendered staff is written into
+        -The number of bars in each system (defaults to a single system)
+        -The RenderCache to be used (defaults to None, for no caching)
+
+    RETURNS:
+        -The name of the written file
+
+    RAISES:
+        -CorruptedFileError, if the score file is faulty
+        -IOError, if a file can't be read or written
+'''
+
+def renderFile(filename, out_dir, barsPerSystem = None, cache = None):
+    text = None
+    if cache is not None:
+        key = cacheKey(filename, renderOptions(barsPerSystem))
+        text = cache.get(key)
+
+    if text is None:
+        sheet = open(filename, "r")
+        try:
+            parse = Parse(sheet, strict = True)
+        finally:
+            sheet.close()
+
+        buf = StringIO()
+        parse.score.printScore(buf, barsPerSystem, info_out = buf)
+        text = buf.getvalue()
+        if cache is not None:
+            cache.put(key, text)
+
+    out_name = outputName(filename, out_dir)
+    out = open(out_name, "w")
+    try:
+        out.write(text)
+    finally:
+        out.close()
+    return out_name
+
+'''
+                            -renderJob-
+    This helper function is run by the worker processes. It renders a single
+    file, catching any errors so that they can be reported by the main
+    process.
+
+    PARAMETERS:
+        -A tuple of the name of the score file, the output folder, the number
+            of bars in each system, the folder and size limit of the cache
+            (or None), and True if the rendering should be profiled
+
+    RETURNS:
+        -A tuple of the name of the score file, either None or a description
+            of the error that occurred, True if the staff was found in the
+            cache, and the statistics of the Profile (or None)
+'''
+
+def renderJob(job):
+    filename, out_dir, barsPerSystem, cache_settings, profiled = job
+    cache = None
+    profile = None
+    error = None
+    try:
+        if cache_settings is not None:
+            cache = RenderCache(*cache_settings)
+        if profiled:
+            profile = Profile()
+            with profile:
+                renderFile(filename, out_dir, barsPerSystem, cache)
+        else:
+            renderFile(filename, out_dir, barsPerSystem, cache)
+    except CorruptedFileError as e:
+        error = "Corrupted file error: %s" % e
+    except (IOError, OSError) as e:
+        error = "File error: %s" % e
+    except Exception as e:
+        error = "%s: %s" % (type(e).__name__, e)
+
+    hit = error is None and cache is not None and cache.hits > 0
+    stats = None
+    if profile is not None:
+        stats = profile.stats
+    return filename, error, hit, stats
+
+'''
+                            -renderFiles-
+    This function renders a number of score files, in parallel if more than
+    one job is asked for.
+
+    PARAMETERS:
+        -The names of the score files
+        -The folder the rendered staves are written into
+        -The number of worker processes (defaults to 1, which renders the
+            files in this process)
+        -The output stream for the report (defaults to sys.stdout)
+        -The number of bars in each system (defaults to a single system)
+        -The cache folder (defaults to None, for no caching)
+        -The size limit of the cache folder in bytes
+        -True if the rendering should be profiled (defaults to False)
+
+    RETURNS:
+        -The number of files that couldn't be rendered
+'''
+
+def renderFiles(filenames, out_dir, jobs = 1, report = sys.stdout, barsPerSystem = None,
+                cache_dir = None, cache_size = DEFAULT_CACHE_SIZE, profiled = False):
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    cache_settings = None
+    if cache_dir is not None:
+        cache_settings = (cache_dir, cache_size)
+
+    #Two inputs with the same name would be rendered into the same file, and
+    #an input must never be overwritten, so those inputs are reported as
+    #errors instead of being rendered
+    inputs = set([os.path.realpath(filename) for filename in filenames])
+    outputs = {}
+    clashes = {}
+    work = []
+    for filename in filenames:
+        out_name = os.path.realpath(outputName(filename, out_dir))
+        if out_name in inputs:
+            clashes[filename] = "File error: the output %s would overwrite an input file" % out_name
+        elif out_name in outputs:
+            clashes[filename] = "File error: the output %s is already written for %s" % (
+                out_name, outputs[out_name])
+        else:
+            outputs[out_name] = filename
+            work.append((filename, out_dir, barsPerSystem, cache_settings, profiled))
+
+    if jobs > 1 and len(work) > 1:
+        chunksize = max(1, len(work) // (jobs * CHUNKS_PER_JOB))
+        pool = multiprocessing.Pool(jobs)
+        try:
+            results = list(pool.imap(renderJob, work, chunksize))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [renderJob(job) for job in work]
+
+    #The cache is trimmed to its size limit once all the entries are stored
+    if cache_settings is not None:
+        RenderCache(*cache_settings).evict()
+
+    #The clashing inputs are put back in their places among the results
+    rendered = iter(results)
+    results = []
+    for filename in filenames:
+        if filename in clashes:
+            results.append((filename, clashes[filename], False, None))
+        else:
+            results.append(next(rendered))
+
+    failures = 0
+    hits = 0
+    profile = Profile()
+    for filename, error, hit, stats in results:
+        if error is not None:
+            print("%s: %s" % (filename, error), file = report)
+            failures += 1
+        elif hit:
+            hits += 1
+        if stats is not None:
+            profile.merge(stats)
+    print("Rendered %d of %d files into %s" % (len(results) - failures, len(results), out_dir), file = report)
+    if cache_dir is not None:
+        print("Render cache: %d hits, %d misses" % (hits, len(results) - failures - hits), file = report)
+    if profiled:
+        print("", file = report)
+        profile.report(report)
+    return failures
+
+'''
+                            -main-
+    This function reads the arguments of the batch mode (without the "render"
+    command itself) and renders the files.
+
+    PARAMETERS:
+        -The list of arguments
+
+    RETURNS:
+        -The exit status: 0 if every file was rendered, 1 otherwise
+'''
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog = "main.py render",
+                                     description = "Render score files without the interactive menu.")
+    parser.add_argument("inputs", nargs = "+", help = "the score files to be rendered")
+    parser.add_argument("--out-dir", required = True, help = "the folder for the rendered files")
+    parser.add_argument("--jobs", type = int, default = 1, help = "the number of worker processes")
+    parser.add_argument("--bars-per-system", type = int, default = None,
+                        help = "wrap the staff into systems of this many bars")
+    parser.add_argument("--cache-dir", default = None, help = "the folder for the render cache")
+    parser.add_argument("--cache-size", type = int, default = DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help = "the size limit of the render cache in megabytes")
+    parser.add_argument("--profile", action = "store_true",
+                        help = "print the time spent in each part of the program")
+    args = parser.parse_args(argv)
+
+    if renderFiles(args.inputs, args.out_dir, max(args.jobs, 1), sys.stdout, args.bars_per_system,
+                   args.cache_dir, args.cache_size * 1024 * 1024, args.profile) > 0:
+        return 1
+    return 0
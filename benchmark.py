@@ -0,0 +1,337 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+from __future__ import division
+from __future__ import print_function
+from parse import Parse
+from staff import Staff
+from note import Note
+from sheetWriter import PITCH_NAMES
+from ticks import WHOLE, HALF, QUARTER, EIGHTH, SIXTEENTH, formatTicks
+import argparse
+import json
+import random
+import sys
+import time
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+try:
+    import tracemalloc
+except ImportError:
+    #Python 2 has no tracemalloc, so the peak memory is left unmeasured
+    tracemalloc = None
+
+'''
+    The benchmark suite times the busiest parts of the program on synthetic
+    scores of different sizes:
+
+        python benchmark.py --sizes 10 1000 100000 --repeat 3 --out results.json
+
+    For each size (the number of notes) and time signature, a score is made
+    with generateScore(), and each benchmark is run on it. The best time of
+    the repeats is reported, along with the throughput in notes per second and
+    the peak memory allocated during a separate run of the benchmark. The
+    results are written out as JSON.
+'''
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+DEFAULT_SIGNATURES = ["2/4", "3/4", "4/4", "6/8"]
+
+#The durations used for the generated notes, and how often each is picked
+DURATIONS = [SIXTEENTH, EIGHTH, 3 * SIXTEENTH, QUARTER, 3 * EIGHTH, HALF, 3 * QUARTER, WHOLE]
+DURATION_WEIGHTS = [2, 6, 1, 8, 2, 4, 1, 1]
+
+SYLLABLES = ["la", "na", "ni", "pu", "so", "ke", "ta", "mi"]
+
+#The number of bars the notes are crammed into for timing straightenStaff()
+CROWDED_BARS = 4
+
+'''
+                            -generateScore-
+    This function makes up a score in the #SHEETMUSIC format. The notes are
+    picked at random, but the same arguments always give the same score.
+
+    About a tenth of the notes are rests, a fifth are chords of two to four
+    tones and a fifth have an accidental. Every other note that isn't a rest
+    gets a syllable of the lyrics.
+
+    PARAMETERS:
+        -The number of notes
+        -The number of bars (defaults to as many as the notes need)
+        -The time signature (a string, such as "3/4")
+        -True if the score should have lyrics (defaults to True)
+        -The seed of the random numbers
+
+    RETURNS:
+        -The score as a string
+'''
+
+def generateScore(notes, bars = None, signature = "4/4", lyrics = True, seed = 0):
+    rand = random.Random(seed)
+    lines = ["#SHEETMUSIC", "", "#SONG INFO", "title : Benchmark %d" % notes,
+             "author : Generator", "", "#TIME"]
+    if bars is not None:
+        lines.append("bars : %d" % bars)
+    lines += ["signature : %s" % signature, "", "#NOTES", ""]
+
+    syllables = []
+    for i in range(notes):
+        if rand.random() < 0.1:
+            lines.append("pitch : rest")
+        else:
+            lines.append("pitch : %s" % randomPitch(rand))
+            if i % 2 == 0:
+                syllables.append(rand.choice(SYLLABLES))
+        duration = weightedChoice(rand, DURATIONS, DURATION_WEIGHTS)
+        lines.append("duration : %s" % formatTicks(duration))
+        if lines[-2] != "pitch : rest" and rand.random() < 0.2:
+            for j in range(rand.randint(1, 3)):
+                lines.append("harmony : %s" % randomPitch(rand))
+        lines.append("")
+
+    if lyrics and len(syllables) > 0:
+        words = []
+        while len(syllables) > 0:
+            length = rand.randint(1, 3)
+            words.append("-".join(syllables[:length]))
+            syllables = syllables[length:]
+        lines += ["#LYRICS", " ".join(words), ""]
+
+    lines.append("#END")
+    return "\n".join(lines) + "\n"
+
+'''
+                            -randomPitch-
+    This helper function picks a pitch name, with an accidental a fifth
+    of the time.
+'''
+
+def randomPitch(rand):
+    name = rand.choice(PITCH_NAMES)
+    if rand.random() < 0.2:
+        name = name[0] + rand.choice("#b") + name[1]
+    return name
+
+'''
+                            -weightedChoice-
+    This helper function picks one of the values, each with a probability
+    relative to its weight.
+'''
+
+def weightedChoice(rand, values, weights):
+    point = rand.uniform(0, sum(weights))
+    for value, weight in zip(values, weights):
+        point -= weight
+        if point <= 0:
+            return value
+    return values[-1]
+
+'''
+                            -copyStaff-
+    This helper function makes a copy of a staff with new Note objects, so that
+    a benchmark that modifies the staff can be repeated on the original.
+'''
+
+def copyStaff(staff):
+    bars = []
+    for bar in staff.notes:
+        copied_bar = []
+        for note in bar:
+            copied_bar.append(Note(note.getPitch(), note.getDuration(), 0, note.getShift(), note.getChord()))
+        bars.append(copied_bar)
+    copy = Staff.fromBars(staff.title, staff.author, staff.time, bars, list(staff.bar_durations))
+    copy.setLyrics(staff.lyrics)
+    return copy
+
+'''
+                            -allNotes-
+    This helper function gives the notes of a staff as copies in a single list.
+'''
+
+def allNotes(staff):
+    return [note for bar in copyStaff(staff).notes for note in bar]
+
+
+class NullWriter(object):
+    '''
+    The NullWriter is an output stream that throws away everything written
+    into it, so that printing isn't slowed down by the terminal.
+    '''
+    def write(self, text):
+        pass
+
+'''
+    The benchmarks. Each is a pair of functions: the first one prepares the
+    input from the score text (and isn't timed), and the second one is the
+    timed part.
+'''
+
+def prepareText(text):
+    return text
+
+def benchParse(text):
+    Parse(StringIO(text))
+
+def prepareNotes(text):
+    staff = Parse(StringIO(text)).staff
+    return staff, allNotes(staff)
+
+def benchAddNote(prepared):
+    staff, notes = prepared
+    new_staff = Staff(staff.title, staff.author, 1, staff.time)
+    for note in notes:
+        new_staff.addNote(note)
+
+def prepareStaff(text):
+    return copyStaff(Parse(StringIO(text)).staff)
+
+def prepareCrowdedStaff(text):
+    #The notes are crammed into a few overly full bars, so that the whole
+    #staff has to be straightened
+    staff = Parse(StringIO(text)).staff
+    notes = allNotes(staff)
+    size = max((len(notes) + CROWDED_BARS - 1) // CROWDED_BARS, 1)
+    bars = [notes[i:i+size] for i in range(0, len(notes), size)]
+    bar_durations = [sum([note.getDuration() for note in bar]) for bar in bars]
+    return Staff.fromBars(staff.title, staff.author, staff.time, bars, bar_durations)
+
+def benchStraightenStaff(staff):
+    staff.straightenStaff()
+
+def benchFillAndReduceRests(staff):
+    staff.fillRests()
+    staff.reduceRests()
+
+def prepareLayouts(text):
+    staff = Parse(StringIO(text)).staff
+    return staff, [staff.layoutBar(barNo) for barNo in range(len(staff.notes))]
+
+def benchInsertNotes(prepared):
+    staff, layouts = prepared
+    for layout in layouts:
+        matrix = staff.initializeMatrix(len(layout) + 1)
+        staff.insertNotes(matrix, layout)
+
+def benchPrintStaff(staff):
+    out = NullWriter()
+    staff.printStaff(out, info_out = out)
+
+#The name of each benchmark, the function that prepares a fresh input for
+#each run, and the timed function
+BENCHMARKS = [
+    ("parse", prepareText, benchParse),
+    ("addNote", prepareNotes, benchAddNote),
+    ("straightenStaff", prepareCrowdedStaff, benchStraightenStaff),
+    ("fillRests+reduceRests", prepareStaff, benchFillAndReduceRests),
+    ("insertNotes", prepareLayouts, benchInsertNotes),
+    ("printStaff", prepareStaff, benchPrintStaff),
+]
+
+'''
+                            -runBenchmark-
+    This function runs a single benchmark on a score.
+
+    PARAMETERS:
+        -The name of the benchmark, the preparing function and the timed
+            function (one entry of BENCHMARKS)
+        -The score text
+        -The number of timed runs
+        -True if the peak memory should be measured (in a separate run)
+
+    RETURNS:
+        -The best time of the runs in seconds, and the peak memory in bytes
+            (None if it wasn't measured)
+'''
+
+def runBenchmark(benchmark, text, repeat, measure_memory):
+    name, prepare, bench = benchmark
+    best = None
+    for i in range(repeat):
+        prepared = prepare(text)
+        start = time.time()
+        bench(prepared)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    peak = None
+    if measure_memory and tracemalloc is not None:
+        prepared = prepare(text)
+        tracemalloc.start()
+        bench(prepared)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, peak
+
+'''
+                            -runBenchmarks-
+    This function runs all the benchmarks on scores of the given sizes.
+
+    PARAMETERS:
+        -The numbers of notes in the scores
+        -The time signatures of the scores
+        -The number of timed runs of each benchmark
+        -True if the peak memory should be measured
+        -The output stream for progress reports (or None)
+
+    RETURNS:
+        -The results as a list of dictionaries
+'''
+
+def runBenchmarks(sizes, signatures = DEFAULT_SIGNATURES, repeat = 3, measure_memory = True,
+                  progress = None):
+    results = []
+    for size in sizes:
+        for signature in signatures:
+            text = generateScore(size, signature = signature)
+            for benchmark in BENCHMARKS:
+                seconds, peak = runBenchmark(benchmark, text, repeat, measure_memory)
+                result = {
+                    "benchmark": benchmark[0],
+                    "notes": size,
+                    "signature": signature,
+                    "seconds": seconds,
+                    "notes_per_second": size / seconds if seconds > 0 else None,
+                    "peak_bytes": peak,
+                }
+                results.append(result)
+                if progress is not None:
+                    print("%-22s %7d notes %4s  %10.6f s" % (benchmark[0], size, signature, seconds),
+                          file = progress)
+    return results
+
+'''
+                            -main-
+    This function reads the command line arguments and runs the benchmarks.
+
+    PARAMETERS:
+        -The list of arguments
+'''
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog = "benchmark.py",
+                                     description = "Time the parsing, layout and printing of synthetic scores.")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = DEFAULT_SIZES,
+                        help = "the numbers of notes in the scores")
+    parser.add_argument("--signatures", nargs = "+", default = DEFAULT_SIGNATURES,
+                        help = "the time signatures of the scores")
+    parser.add_argument("--repeat", type = int, default = 3, help = "the number of timed runs")
+    parser.add_argument("--no-memory", action = "store_true", help = "don't measure the peak memory")
+    parser.add_argument("--out", default = None, help = "the JSON file for the results (defaults to stdout)")
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(args.sizes, args.signatures, max(args.repeat, 1), not args.no_memory,
+                            sys.stderr)
+    if args.out is None:
+        json.dump(results, sys.stdout, indent = 2)
+        print()
+    else:
+        out = open(args.out, "w")
+        json.dump(results, out, indent = 2)
+        out.close()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,243 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+import mmap
+import struct
+from note import Note
+from staff import Staff
+from parse import Parse
+from lazyBars import LazyBars
+from sheetWriter import writeSheet, lyricsText
+from corruptedFileError import CorruptedFileError
+
+'''
+    The binary score format stores a staff that has already been laid out, so
+    that it can be opened without parsing and laying out the notes again.
+
+    All numbers are little-endian. The file consists of:
+        -the header: the MAGIC bytes, the format VERSION, the time signature in
+            ticks, and the number of bars, notes and chord tones
+        -the title, the author and the lyrics (in the format of the #LYRICS
+            section), each as a 4-byte length followed by UTF-8 text
+        -the changes of the time signature after the first bar: their number,
+            followed by the index of the bar and the time signature in ticks
+            of each change
+        -the bar table: the index of the first note and the first chord tone
+            of each bar (plus one past the last bar), and the summed up
+            duration of each bar
+        -the note records: pitch, shift, duration in ticks, the index of the
+            first tone of its chord (counted from the first chord tone of the
+            bar) and the number of tones in the chord
+        -the harmony records: pitch and shift of each chord tone
+
+    Since the records of a bar don't refer to anything outside of the bar,
+    a bar that hasn't been changed can be copied from one file to another
+    as it is.
+'''
+
+MAGIC = b"SMSB"
+VERSION = 5
+
+HEADER = struct.Struct("<4sHHiiii")
+LENGTH = struct.Struct("<I")
+NOTE_RECORD = struct.Struct("<hhiih")
+HARMONY_RECORD = struct.Struct("<hh")
+METER_RECORD = struct.Struct("<ii")
+
+'''
+                            -writeBinary-
+    This function writes a staff out in the binary score format. The bars of
+    a staff opened with loadBinary() that haven't been read are copied from
+    the original file as they are.
+
+    PARAMETERS:
+        -The Staff object to be written
+        -The output stream (opened in binary mode)
+'''
+
+def writeBinary(staff, out):
+    note_records = bytearray()
+    harmony_records = bytearray()
+    note_offsets = [0]
+    harmony_offsets = [0]
+    bar_durations = []
+
+    for barNo in range(len(staff.notes)):
+        raw_bar = None
+        if isinstance(staff.notes, LazyBars):
+            raw_bar = staff.notes.rawBar(barNo)
+
+        if raw_bar is not None:
+            notes, harmonies, duration = raw_bar
+            note_records += notes
+            harmony_records += harmonies
+        else:
+            duration = 0
+            harmonyNo = 0
+            for note in staff.notes[barNo]:
+                chord = note.getChord()
+                note_records += NOTE_RECORD.pack(note.getPitch(), note.getShift(), note.getDuration(),
+                                                 harmonyNo, len(chord))
+                for pitch, shift in chord:
+                    harmony_records += HARMONY_RECORD.pack(pitch, shift)
+                harmonyNo += len(chord)
+                duration += note.getDuration()
+
+        note_offsets.append(len(note_records) // NOTE_RECORD.size)
+        harmony_offsets.append(len(harmony_records) // HARMONY_RECORD.size)
+        bar_durations.append(duration)
+
+    bar_count = len(bar_durations)
+    out.write(HEADER.pack(MAGIC, VERSION, 0, staff.time, bar_count,
+                          note_offsets[-1], harmony_offsets[-1]))
+    for text in [staff.title, staff.author, lyricsText(staff.lyrics)]:
+        if not isinstance(text, bytes):
+            text = text.encode("utf-8")
+        out.write(LENGTH.pack(len(text)) + text)
+
+    changes = staff.meters.effectiveChanges()
+    out.write(LENGTH.pack(len(changes)))
+    for barNo, time in changes:
+        out.write(METER_RECORD.pack(barNo, time))
+
+    out.write(struct.pack("<%di" % (bar_count + 1), *note_offsets))
+    out.write(struct.pack("<%di" % (bar_count + 1), *harmony_offsets))
+    out.write(struct.pack("<%di" % bar_count, *bar_durations))
+    out.write(bytes(note_records))
+    out.write(bytes(harmony_records))
+
+'''
+                            -loadBinary-
+    This function opens a staff saved in the binary score format. The file is
+    memory-mapped, and only the header and the bar table are read right away;
+    the notes of each bar are read when the bar is first used.
+
+    PARAMETERS:
+        -The name of the file
+
+    RETURNS:
+        -The Staff object
+
+    RAISES:
+        -CorruptedFileError, if the file isn't a binary score of this version
+'''
+
+def loadBinary(filename):
+    score_file = open(filename, "rb")
+    try:
+        data = mmap.mmap(score_file.fileno(), 0, access = mmap.ACCESS_READ)
+    except ValueError:
+        raise CorruptedFileError("Empty binary score file")
+    finally:
+        score_file.close()
+
+    if len(data) < HEADER.size:
+        raise CorruptedFileError("Unknown data file (missing header)")
+    magic, version, flags, time, bar_count, note_count, harmony_count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise CorruptedFileError("Unknown data file (missing header)")
+    if version != VERSION:
+        raise CorruptedFileError("Unsupported binary score version %d" % version)
+
+    position = HEADER.size
+    texts = []
+    for i in range(3):
+        length = LENGTH.unpack_from(data, position)[0]
+        position += LENGTH.size
+        text = data[position:position + length]
+        #The strings are byte strings on Python 2, so the text is only
+        #decoded on Python 3, just like the text read by Parse
+        if not isinstance(text, str):
+            text = text.decode("utf-8")
+        texts.append(text)
+        position += length
+    title, author, lyrics = texts
+
+    change_count = LENGTH.unpack_from(data, position)[0]
+    position += LENGTH.size
+    changes = []
+    for i in range(change_count):
+        changes.append(METER_RECORD.unpack_from(data, position))
+        position += METER_RECORD.size
+
+    offsets_start = position
+    harmony_offsets_start = offsets_start + 4 * (bar_count + 1)
+    durations_start = harmony_offsets_start + 4 * (bar_count + 1)
+    notes_start = durations_start + 4 * bar_count
+    harmonies_start = notes_start + NOTE_RECORD.size * note_count
+    if len(data) < harmonies_start + HARMONY_RECORD.size * harmony_count:
+        raise CorruptedFileError("Binary score file is cut short")
+
+    bar_durations = list(struct.unpack_from("<%di" % bar_count, data, durations_start))
+
+    #The notes of a single bar are read from the file only when needed
+    def loadBar(barNo):
+        start, end = struct.unpack_from("<2i", data, offsets_start + 4 * barNo)
+        first_harmony = struct.unpack_from("<i", data, harmony_offsets_start + 4 * barNo)[0]
+        bar = []
+        for i in range(start, end):
+            pitch, shift, duration, harmonyNo, chord_size = NOTE_RECORD.unpack_from(
+                data, notes_start + i * NOTE_RECORD.size)
+            chord = [HARMONY_RECORD.unpack_from(data, harmonies_start + j * HARMONY_RECORD.size)
+                     for j in range(first_harmony + harmonyNo, first_harmony + harmonyNo + chord_size)]
+            bar.append(Note(pitch, duration, 0, shift, chord))
+        return bar
+
+    #The records of a single bar, as they are in the file
+    def loadRawBar(barNo):
+        start, end = struct.unpack_from("<2i", data, offsets_start + 4 * barNo)
+        first_harmony, end_harmony = struct.unpack_from("<2i", data, harmony_offsets_start + 4 * barNo)
+        notes = data[notes_start + start * NOTE_RECORD.size:notes_start + end * NOTE_RECORD.size]
+        harmonies = data[harmonies_start + first_harmony * HARMONY_RECORD.size:
+                         harmonies_start + end_harmony * HARMONY_RECORD.size]
+        return notes, harmonies, bar_durations[barNo]
+
+    staff = Staff.fromBars(title, author, time, LazyBars(bar_count, loadBar, loadRawBar), bar_durations)
+    for barNo, change_time in changes:
+        staff.addMeterChange(barNo, change_time)
+    if lyrics != "":
+        staff.setLyrics([word.split("-") for word in lyrics.split(" ")])
+    return staff
+
+'''
+                            -textToBinary-
+    This function converts a score file in the #SHEETMUSIC format into the
+    binary score format.
+
+    PARAMETERS:
+        -The name of the #SHEETMUSIC file
+        -The name of the binary file to be written
+
+    RAISES:
+        -CorruptedFileError, if the score has more than one part, since the
+            binary score format only holds a single staff
+'''
+
+def textToBinary(textFilename, binaryFilename):
+    sheet = open(textFilename, "r")
+    parse = Parse(sheet)
+    sheet.close()
+    if len(parse.score.parts) > 1:
+        raise CorruptedFileError("A score with several parts can't be stored in the binary score format")
+
+    out = open(binaryFilename, "wb")
+    writeBinary(parse.staff, out)
+    out.close()
+
+'''
+                            -binaryToText-
+    This function converts a score file in the binary score format into the
+    #SHEETMUSIC format.
+
+    PARAMETERS:
+        -The name of the binary file
+        -The name of the #SHEETMUSIC file to be written
+'''
+
+def binaryToText(binaryFilename, textFilename):
+    staff = loadBinary(binaryFilename)
+
+    out = open(textFilename, "w")
+    writeSheet(staff, out)
+    out.close()
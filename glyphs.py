@@ -0,0 +1,43 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+import os
+
+'''
+    The glyphs (such as the G-cleff) are drawn from text files in the data
+    folder next to this file, so they are found no matter which folder the
+    program is run from. Each file is read only once, when it is first
+    needed, and kept in memory after that.
+'''
+
+GLYPH_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+GLYPH_FILES = {
+    "G-cleff": "G-cleff.txt",
+}
+
+loaded_glyphs = {}
+
+'''
+                            -getGlyph-
+    This function gives the rows of a glyph, loading it from its file if
+    it hasn't been loaded yet.
+
+    PARAMETERS:
+        -The name of the glyph (such as "G-cleff")
+
+    RETURNS:
+        -The rows of the glyph as strings (without line breaks), or None if
+            the file of the glyph couldn't be read
+'''
+
+def getGlyph(name):
+    if name not in loaded_glyphs:
+        try:
+            glyph_file = open(os.path.join(GLYPH_FOLDER, GLYPH_FILES[name]), "r")
+            loaded_glyphs[name] = glyph_file.read().split("\n")
+            glyph_file.close()
+        except IOError:
+            loaded_glyphs[name] = None
+    return loaded_glyphs[name]
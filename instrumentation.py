@@ -0,0 +1,146 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+from __future__ import print_function
+from parse import Parse
+from staff import Staff
+from score import Score
+import functools
+import sys
+import time
+
+'''
+    The instrumentation records how many times each busy part of the program
+    is called, how much time is spent in it and how many memory blocks it
+    leaves allocated. It is turned on with a Profile:
+
+        with Profile() as profile:
+            Parse(sheet).printStaff()
+        profile.report()
+
+    The instrumented methods are only replaced with timing wrappers for the
+    duration of the with-block, so there is no cost at all when no Profile
+    is active. The times are cumulative: the time of a method includes the
+    time of the instrumented methods it calls.
+'''
+
+#The instrumented methods, as (class, name of the method)
+INSTRUMENTED = [
+    (Parse, "handleInfo"),
+    (Parse, "handleTime"),
+    (Parse, "handleNotes"),
+    (Parse, "handleLyrics"),
+    (Staff, "addNote"),
+    (Staff, "extend"),
+    (Staff, "straightenStaff"),
+    (Staff, "reflow"),
+    (Staff, "reflowFrom"),
+    (Staff, "fillRests"),
+    (Staff, "fillBar"),
+    (Staff, "reduceRests"),
+    (Staff, "renderBar"),
+    (Staff, "layoutBar"),
+    (Staff, "initializeMatrix"),
+    (Staff, "insertNotes"),
+    (Staff, "addLyrics"),
+    (Staff, "lyricsLine"),
+    (Score, "layout"),
+]
+
+#The number of memory blocks allocated by the interpreter. Python 2 can't
+#tell it, so the blocks are left at 0 there.
+allocatedBlocks = getattr(sys, "getallocatedblocks", lambda: 0)
+
+
+class Profile(object):
+    '''
+    A Profile instruments the methods in INSTRUMENTED while it is active
+    (inside a with-block), and collects their statistics.
+    '''
+
+    '''
+                                -Initializer-
+        PARAMETERS:
+            -the methods to be instrumented (defaults to INSTRUMENTED)
+    '''
+    def __init__(self, methods = INSTRUMENTED):
+        self.methods = methods
+
+        #The statistics of each phase by its name ("Class.method"), as
+        #[calls, seconds, memory blocks]
+        self.stats = {}
+        self.originals = []
+
+    def __enter__(self):
+        for cls, name in self.methods:
+            function = cls.__dict__[name]
+            self.originals.append((cls, name, function))
+            setattr(cls, name, self.wrap("%s.%s" % (cls.__name__, name), function))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        #The methods are put back in the reverse order, so that nested
+        #Profiles are undone correctly
+        while len(self.originals) > 0:
+            cls, name, function = self.originals.pop()
+            setattr(cls, name, function)
+        return False
+
+    '''
+                                -wrap-
+        This helper function makes the timing wrapper of a method
+
+        PARAMETERS:
+            -the name of the phase
+            -the original function
+
+        RETURNS:
+            -the wrapper function
+    '''
+    def wrap(self, phase, function):
+        entry = self.stats.setdefault(phase, [0, 0.0, 0])
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            blocks = allocatedBlocks()
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                entry[0] += 1
+                entry[1] += time.time() - start
+                entry[2] += allocatedBlocks() - blocks
+        return wrapper
+
+    '''
+                                -merge-
+        This function adds the statistics of another Profile (for example,
+        one run in a worker process) to this one.
+
+        PARAMETERS:
+            -the statistics dictionary of the other Profile
+    '''
+    def merge(self, stats):
+        for phase, (calls, seconds, blocks) in stats.items():
+            entry = self.stats.setdefault(phase, [0, 0.0, 0])
+            entry[0] += calls
+            entry[1] += seconds
+            entry[2] += blocks
+
+    '''
+                                -report-
+        This function prints the statistics of the phases that were called,
+        the slowest first.
+
+        PARAMETERS:
+            -the output stream (defaults to sys.stdout)
+    '''
+    def report(self, out = None):
+        if out is None:
+            out = sys.stdout
+        print("%-24s %10s %12s %12s" % ("phase", "calls", "seconds", "blocks"), file = out)
+        phases = [(entry[1], phase) for phase, entry in self.stats.items() if entry[0] > 0]
+        for seconds, phase in sorted(phases, reverse = True):
+            calls, seconds, blocks = self.stats[phase]
+            print("%-24s %10d %12.6f %12d" % (phase, calls, seconds, blocks), file = out)
@@ -0,0 +1,70 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+
+class LazyBars(list):
+    '''
+    LazyBars is the array of bars of a staff that has been opened from a file,
+    where each bar is only read from the file when it is first used. Until
+    then, its place in the array holds None.
+    '''
+
+    '''
+                                -Initializer-
+        PARAMETERS:
+            -the number of bars
+            -the function used to read a bar, given its index
+            -the function used to read the bar as it is stored in the file,
+                given its index (optional)
+    '''
+    def __init__(self, barCount, loadBar, loadRawBar = None):
+        list.__init__(self, [None] * barCount)
+        self.loadBar = loadBar
+        self.loadRawBar = loadRawBar
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        bar = list.__getitem__(self, index)
+        if bar is None:
+            bar = self.loadBar(index)
+            list.__setitem__(self, index, bar)
+        return bar
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    '''
+                                -isLoaded-
+        This function tells if a bar has been read from the file yet
+
+        PARAMETERS:
+            -the index of the bar
+
+        RETURNS:
+            -True if the bar has been read, False otherwise
+    '''
+    def isLoaded(self, index):
+        return list.__getitem__(self, index) is not None
+
+    '''
+                                -rawBar-
+        This function gives a bar as it is stored in the file, so that a bar
+        that hasn't been used (and so can't have been changed) can be written
+        back without reading its notes.
+
+        PARAMETERS:
+            -the index of the bar
+
+        RETURNS:
+            -whatever the loadRawBar function gives for the bar, or None if
+                the bar has already been read or there is no such function
+    '''
+    def rawBar(self, index):
+        if self.loadRawBar is None or self.isLoaded(index):
+            return None
+        return self.loadRawBar(index)
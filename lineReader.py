@@ -0,0 +1,67 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+#The amount of characters read from the stream at a time
+CHUNK_SIZE = 65536
+
+
+class LineReader(object):
+    '''
+    The LineReader reads an input stream in large chunks, and hands out the
+    lines that have some content in them one at a time. Only a single chunk
+    of the stream is held in memory at once.
+    '''
+
+    '''
+                                -Initializer-
+        PARAMETERS:
+            -the input stream
+            -the amount of characters to read at a time (defaults to CHUNK_SIZE)
+    '''
+    def __init__(self, input, chunk_size = CHUNK_SIZE):
+        self.input = input
+        self.chunk_size = chunk_size
+
+        #The complete lines of the current chunk, and the unfinished line
+        #at the end of it
+        self.lines = []
+        self.index = 0
+        self.rest = ""
+        self.finished = False
+
+    '''
+                                -nextLine-
+        This function gives the next line in the stream that has some content
+        in it, stripped of excess whitespace.
+
+        RETURNS:
+            -the next line, or "" when the end of the stream has been reached
+    '''
+    def nextLine(self):
+        while True:
+            while self.index < len(self.lines):
+                line = self.lines[self.index].strip()
+                self.index += 1
+                if line != "":
+                    return line
+
+            if self.finished:
+                return ""
+            self.readChunk()
+
+    '''
+                                -readChunk-
+        This helper function reads the next chunk of the stream and splits it
+        into lines.
+    '''
+    def readChunk(self):
+        chunk = self.input.read(self.chunk_size)
+        if chunk == "":
+            self.lines = [self.rest]
+            self.rest = ""
+            self.finished = True
+        else:
+            self.lines = (self.rest + chunk).split("\n")
+            self.rest = self.lines.pop()
+        self.index = 0
@@ -7,9 +7,45 @@
 from parse import Parse
 from staff import Staff
 from corruptedFileError import CorruptedFileError
+from scoreIndex import openIndexed
+import batch
 import sys
 import StringIO
 
+'''
+                            -openScore-
+        This function opens a score file for the interactive mode. The score
+        is opened through its index (see scoreIndex.py) when possible. A score
+        with several parts can't be indexed, and neither can a score in a folder
+        that can't be written to, so those are parsed as they are.
+        
+        Note that the menu prints the whole staff before the first prompt, so
+        every bar is read from the index right away anyway. The index only
+        saves the parsing and laying out of the notes.
+        
+        PARAMETERS:
+            -The name of the score file
+        
+        RETURNS:
+            -The Parse object
+        
+        RAISES:
+            -IOError, if the score file can't be read
+'''
+
+def openScore(filename):
+    try:
+        return Parse.fromStaff(openIndexed(filename))
+    except CorruptedFileError:
+        pass
+    except (IOError, OSError):
+        pass
+    sheet = open(filename, 'r')
+    try:
+        return Parse(sheet)
+    finally:
+        sheet.close()
+
 '''
                     -THE MAIN FUNCTION-
         This is the function meant to be called by an actual user. 
@@ -20,17 +56,22 @@ import StringIO
         
         If no file is specified, it defaults to using a 4-bar (4/4) empty staff, 
         specified in empty.txt.
+        
+        Many files can be rendered at once without the menu with
+            main.py render <inputs...> --out-dir DIR --jobs N
+        (see batch.py).
 '''
 
 def main(argv = []):
     #If there are no arguments, use empty.txt
+    sheet = None
     if len(sys.argv) <= 1:
         sheet = open('data/empty.txt', 'r')
+        parse = Parse(sheet)
     else:
         #Else, try opening the file and using it. If failed, use empty.txt
         try:
-            sheet = open(sys.argv[1], 'r')
-            parse = Parse(sheet)
+            parse = openScore(sys.argv[1])
         except:
             print("Corrupted file error. Starting from an empty file.")
             sheet = open('data/empty.txt', 'r')
@@ -68,8 +109,9 @@ def main(argv = []):
                     print("Enter the bar of the note [1 - %d]:\n" % maxBars)
                     barNo = int(raw_input())
                 
-                #Select a note from that specified bar
-                maxNotes = len(parse.staff.notes[barNo-1])
+                #Select a note from that specified bar, counting the rests
+                #that are drawn to fill it up
+                maxNotes = len(parse.staff.layoutBar(barNo-1))
                 if maxNotes > 1:
                     noteNo = -1
                     while noteNo not in range(1, maxNotes + 1):
@@ -128,6 +170,11 @@ def main(argv = []):
     
     #Exit the program on choice No. 6
     print("Exiting the program.")
-    sheet.close()
-    
-main()
\ No newline at end of file
+    if sheet is not None:
+        sheet.close()
+
+if __name__ == "__main__":
+    #The "render" command runs the batch mode instead of the interactive menu
+    if len(sys.argv) > 1 and sys.argv[1] == "render":
+        sys.exit(batch.main(sys.argv[2:]))
+    main()
\ No newline at end of file
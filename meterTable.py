@@ -0,0 +1,164 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+from ticks import formatTicks
+import bisect
+
+
+class MeterTable(object):
+    '''
+    The MeterTable keeps the time signature of every bar of a staff. The piece
+    starts in one time signature, and it can change at the beginning of any
+    later bar, staying the same until the next change.
+
+    The start of each bar (in ticks from the beginning of the piece) is kept in
+    a prefix array up to the last change, so that the length and the start of
+    any bar are found in constant time. After the last change every bar has the
+    same length, so the bars there are simply counted.
+
+    The changes are kept just as they were given, even the ones to the time
+    signature that is already in effect, since the time signature before them
+    may still be edited. Such changes are only left out of the prefix array and
+    of what is written out (see effectiveChanges()).
+    '''
+
+    '''
+                                -Initializer-
+        PARAMETERS:
+            -the time signature at the beginning of the piece (the length of
+                a bar in ticks)
+    '''
+    def __init__(self, time_sig):
+        #The changes of the time signature as (index of the bar, time
+        #signature) pairs, in order. The first one is always at bar 0.
+        self.changes = [(0, time_sig)]
+        self.build()
+
+    '''
+                                -build-
+        This helper function works out the prefix array of the bar starts
+        again from the changes.
+    '''
+    def build(self):
+        changes = [self.changes[0]] + self.effectiveChanges()
+        self.bar_starts = [0]
+        for (barNo, time), (nextBar, nextTime) in zip(changes, changes[1:]):
+            for i in range(barNo, nextBar):
+                self.bar_starts.append(self.bar_starts[-1] + time)
+        self.last_time = changes[-1][1]
+
+    '''
+                                -setTime-
+        This function sets the time signature at the beginning of the piece.
+        The changes later in the piece are kept.
+
+        PARAMETERS:
+            -the time signature in ticks
+    '''
+    def setTime(self, time):
+        self.addChange(0, time)
+
+    '''
+                                -addChange-
+        This function changes the time signature from a bar onwards, until
+        the next change that comes after it.
+
+        PARAMETERS:
+            -the index of the bar (starting from 0)
+            -the time signature in ticks
+    '''
+    def addChange(self, barNo, time):
+        self.changes = [change for change in self.changes if change[0] != barNo]
+        self.changes.append((barNo, time))
+        self.changes.sort()
+        self.build()
+
+    '''
+                                -barTime-
+        This function gives the length of a bar
+
+        PARAMETERS:
+            -the index of the bar
+
+        RETURNS:
+            -the time signature of the bar in ticks
+    '''
+    def barTime(self, barNo):
+        if barNo + 1 < len(self.bar_starts):
+            return self.bar_starts[barNo + 1] - self.bar_starts[barNo]
+        return self.last_time
+
+    '''
+                                -barStart-
+        This function gives the start of a bar, counted from the beginning
+        of the piece
+
+        PARAMETERS:
+            -the index of the bar
+
+        RETURNS:
+            -the start of the bar in ticks
+    '''
+    def barStart(self, barNo):
+        last = len(self.bar_starts) - 1
+        if barNo <= last:
+            return self.bar_starts[barNo]
+        return self.bar_starts[last] + (barNo - last) * self.last_time
+
+    '''
+                                -barAt-
+        This function finds the bar that a point in time falls in
+
+        PARAMETERS:
+            -the time in ticks from the beginning of the piece (not negative)
+
+        RETURNS:
+            -the index of the bar
+    '''
+    def barAt(self, tick):
+        last = len(self.bar_starts) - 1
+        if tick < self.bar_starts[last]:
+            return bisect.bisect_right(self.bar_starts, tick) - 1
+        return last + (tick - self.bar_starts[last]) // self.last_time
+
+    '''
+                                -laterChanges-
+        This function gives the changes after the beginning of the piece, as
+        they were given
+
+        RETURNS:
+            -a list of (index of the bar, time signature) pairs
+    '''
+    def laterChanges(self):
+        return self.changes[1:]
+
+    '''
+                                -effectiveChanges-
+        This function gives the changes after the beginning of the piece that
+        actually change the time signature, leaving out the ones to the time
+        signature that is already in effect
+
+        RETURNS:
+            -a list of (index of the bar, time signature) pairs
+    '''
+    def effectiveChanges(self):
+        changes = []
+        time = self.changes[0][1]
+        for barNo, nextTime in self.changes[1:]:
+            if nextTime != time:
+                changes.append((barNo, nextTime))
+                time = nextTime
+        return changes
+
+    '''
+                                -describeChanges-
+        This function describes the changes after the beginning of the piece
+        for the song info, for example "3/4 from bar 17, 4/4 from bar 20".
+
+        RETURNS:
+            -the description as a string (empty if there are no changes)
+    '''
+    def describeChanges(self):
+        return ", ".join(["%s from bar %d" % (formatTicks(time), barNo + 1)
+                          for barNo, time in self.effectiveChanges()])
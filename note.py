@@ -7,22 +7,31 @@ class Note(object):
     The Note object represents one note or rest on the staff
     '''
     
+    #Scores can hold a lot of notes, so the attributes are kept in slots
+    #instead of a dictionary for every note
+    __slots__ = ("pitch", "duration", "chord", "shift")
+    
     '''
                                 -Initializer-
         PARAMETERS:
             - note pitch (an integer from 0 to 11), which correspond to different
                 notes (lower integers mean higher pitches. g2 = 0, f2 = 1.... c1 = 11)
-            - note duration (a positive number). A number of 1 means a whole note,
-                0.5 means a half note etc.
-            - note harmony (an integer between 0 and 11). Numbers above 0 imply a
-                harmonized note that plays at the same time as the lowest note.
+            - note duration (a positive integer) in ticks. A whole note is 96 ticks
+                long, a half note 48 ticks etc. (see ticks.py)
+            - note harmony (a Note object, or 0 for none). The pitch of the harmony
+                is added to the chord of the note.
             - note shift (-1, 0 or 1). Implies if a note is flat of sharp.
+            - the other tones of the chord, as (pitch, shift) pairs (optional)
     '''
-    def __init__(self, pitch, duration, harmony = 0, shift = 0):
+    def __init__(self, pitch, duration, harmony = 0, shift = 0, chord = ()):
         self.pitch = pitch
         self.duration = duration
-        self.harmony = harmony
         self.shift = shift
+        self.chord = ()
+        if len(chord) > 0:
+            self.setChord(chord)
+        if harmony != 0:
+            self.addChordTone(harmony.getPitch(), harmony.getShift())
     
     '''
     GET- and SET- functions
@@ -40,15 +49,45 @@ class Note(object):
     def setDuration(self, duration):
         self.duration = duration
     
-    def getHarmony(self):
-        return self.harmony
-    
-    def  setHarmony(self, harmony):
-        self.harmony = harmony
-    
     def getShift(self):
         return self.shift
     
     def setShift(self, shift):
         self.shift = shift
+    
+    '''
+                                -Chords-
+        The other tones that are played at the same time as the note make up its
+        chord. They all last as long as the note itself, so only their pitches
+        and shifts are kept, as a tuple of (pitch, shift) pairs sorted by pitch.
+    '''
+    
+    def getChord(self):
+        return self.chord
+    
+    def setChord(self, tones):
+        self.chord = tuple(sorted(tones))
+    
+    def addChordTone(self, pitch, shift = 0):
+        self.chord = tuple(sorted(self.chord + ((pitch, shift),)))
+    
+    '''
+        The harmony of a note is the first tone of its chord, given as a
+        separate Note object (a copy, so changing it doesn't change the chord).
+        Setting the harmony replaces the whole chord with that one tone.
+    '''
+    
+    def getHarmony(self):
+        if len(self.chord) == 0:
+            return 0
+        pitch, shift = self.chord[0]
+        return Note(pitch, self.duration, 0, shift)
+    
+    def setHarmony(self, harmony):
+        if harmony == 0:
+            self.chord = ()
+        else:
+            self.chord = ((harmony.getPitch(), harmony.getShift()),)
+    
+    harmony = property(getHarmony, setHarmony)
     
\ No newline at end of file
@@ -0,0 +1,275 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+from array import array
+from note import Note
+
+#The harmony column holds this value for notes that have no chord
+NO_HARMONY = -1
+
+
+class NoteStore(object):
+    '''
+    The NoteStore keeps the notes of a staff in parallel arrays (one column for
+    each property of a note) instead of separate Note objects, which takes only
+    a fraction of the memory for long scores.
+
+    The notes of all the bars are stored one after another, and bar_offsets
+    tells where each bar starts, so that the notes of bar i are the records
+    from bar_offsets[i] up to bar_offsets[i+1]. The other tones of the chord
+    of a note are kept in the harmony_pitches and harmony_shifts columns: the
+    harmony column holds the index of the first tone (or NO_HARMONY), and the
+    chord_sizes column the number of tones.
+
+    A staff made with Staff.fromStore() reads and writes the notes of the
+    store through views, but when it moves notes from one bar to another (or
+    splits or adds them), the new layout only exists in the bars of the staff.
+    The store is then marked as stale, and can't be unpacked anymore. The bars
+    the staff hasn't touched are still read from the store as they are.
+    '''
+
+    def __init__(self):
+        self.pitches = array('h')
+        self.shifts = array('h')
+        self.durations = array('i')
+        self.harmonies = array('i')
+        self.chord_sizes = array('h')
+
+        self.harmony_pitches = array('h')
+        self.harmony_shifts = array('h')
+
+        self.bar_offsets = array('i', [0])
+
+        #True once the staff using the store has changed its layout
+        self.stale = False
+
+    '''
+                                -fromStaff-
+        This function packs the notes of a staff into a new NoteStore
+
+        PARAMETERS:
+            -The Staff object to be packed
+
+        RETURNS:
+            -The new NoteStore object
+    '''
+    @classmethod
+    def fromStaff(cls, staff):
+        store = cls()
+        for bar in staff.notes:
+            for note in bar:
+                store.append(note)
+            store.endBar()
+        return store
+
+    '''
+                                -append-
+        This function adds a note to the end of the last bar in the store
+
+        PARAMETERS:
+            -The Note object (or a view to another store) to be added
+    '''
+    def append(self, note):
+        self.pitches.append(note.getPitch())
+        self.shifts.append(note.getShift())
+        self.durations.append(note.getDuration())
+        chord = note.getChord()
+        self.harmonies.append(self.addChord(chord))
+        self.chord_sizes.append(len(chord))
+
+    '''
+                                -addChord-
+        This helper function stores the tones of a chord in the harmony columns
+
+        PARAMETERS:
+            -The tones of the chord as (pitch, shift) pairs
+
+        RETURNS:
+            -The index of the first tone in the harmony columns, or NO_HARMONY
+                if there are no tones
+    '''
+    def addChord(self, tones):
+        if len(tones) == 0:
+            return NO_HARMONY
+        first = len(self.harmony_pitches)
+        for pitch, shift in tones:
+            self.harmony_pitches.append(pitch)
+            self.harmony_shifts.append(shift)
+        return first
+
+    '''
+                                -endBar-
+        This function closes the current bar, so that the next note appended
+        starts a new bar.
+    '''
+    def endBar(self):
+        self.bar_offsets.append(len(self.pitches))
+
+    def barCount(self):
+        return len(self.bar_offsets) - 1
+
+    def noteCount(self):
+        return len(self.pitches)
+
+    '''
+                                -bar-
+        This function gives the notes of a single bar as views, which work
+        like Note objects but read and write the arrays of the store.
+
+        PARAMETERS:
+            -The index of the bar (starting from 0)
+
+        RETURNS:
+            -A list of NoteView objects
+    '''
+    def bar(self, barNo):
+        start = self.bar_offsets[barNo]
+        end = self.bar_offsets[barNo + 1]
+        return [NoteView(self, index) for index in range(start, end)]
+
+    '''
+                                -barDuration-
+        This function sums up the durations of a single bar, without creating
+        views for its notes.
+
+        PARAMETERS:
+            -The index of the bar (starting from 0)
+    '''
+    def barDuration(self, barNo):
+        return sum(self.durations[self.bar_offsets[barNo]:self.bar_offsets[barNo + 1]])
+
+    '''
+                                -toNotes-
+        This function unpacks the store back into Note objects
+
+        RETURNS:
+            -A 2D-array of Note objects, one small array for each bar
+
+        RAISES:
+            -ValueError, if the store is stale
+    '''
+    def toNotes(self):
+        if self.stale:
+            raise ValueError("The note store is out of date with its staff")
+        notes = []
+        for barNo in range(self.barCount()):
+            bar = []
+            for view in self.bar(barNo):
+                bar.append(Note(view.getPitch(), view.getDuration(), 0, view.getShift(), view.getChord()))
+            notes.append(bar)
+        return notes
+
+
+class NoteView(object):
+    '''
+    The NoteView object is a single note of a NoteStore. It has the same GET- and
+    SET-functions as a Note, so the Staff can use it in place of one.
+    '''
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def getPitch(self):
+        return self.store.pitches[self.index]
+
+    def setPitch(self, pitchNo):
+        self.store.pitches[self.index] = pitchNo
+
+    def getDuration(self):
+        return self.store.durations[self.index]
+
+    def setDuration(self, duration):
+        self.store.durations[self.index] = duration
+
+    def getChord(self):
+        first = self.store.harmonies[self.index]
+        if first == NO_HARMONY:
+            return ()
+        last = first + self.store.chord_sizes[self.index]
+        return tuple(zip(self.store.harmony_pitches[first:last], self.store.harmony_shifts[first:last]))
+
+    def setChord(self, tones):
+        #The new tones are added to the end of the harmony columns, since the
+        #chord might not fit in the place of the old one
+        tones = tuple(sorted(tones))
+        self.store.harmonies[self.index] = self.store.addChord(tones)
+        self.store.chord_sizes[self.index] = len(tones)
+
+    def addChordTone(self, pitch, shift = 0):
+        self.setChord(self.getChord() + ((pitch, shift),))
+
+    def getHarmony(self):
+        harmonyNo = self.store.harmonies[self.index]
+        if harmonyNo == NO_HARMONY:
+            return 0
+        return HarmonyView(self.store, harmonyNo, self.index)
+
+    def setHarmony(self, harmony):
+        if harmony == 0:
+            self.setChord(())
+        else:
+            self.setChord(((harmony.getPitch(), harmony.getShift()),))
+
+    def getShift(self):
+        return self.store.shifts[self.index]
+
+    def setShift(self, shift):
+        self.store.shifts[self.index] = shift
+
+    pitch = property(getPitch, setPitch)
+    duration = property(getDuration, setDuration)
+    harmony = property(getHarmony, setHarmony)
+    shift = property(getShift, setShift)
+    chord = property(getChord, setChord)
+
+
+class HarmonyView(object):
+    '''
+    The HarmonyView object is the harmony (the first tone of the chord) of a
+    single note in a NoteStore. A harmony always lasts as long as the note it
+    harmonizes, so its duration is read from that note, and setting it has
+    no effect.
+    '''
+
+    __slots__ = ("store", "index", "owner")
+
+    def __init__(self, store, index, owner):
+        self.store = store
+        self.index = index
+        self.owner = owner
+
+    def getPitch(self):
+        return self.store.harmony_pitches[self.index]
+
+    def setPitch(self, pitchNo):
+        self.store.harmony_pitches[self.index] = pitchNo
+
+    def getDuration(self):
+        return self.store.durations[self.owner]
+
+    def setDuration(self, duration):
+        pass
+
+    def getHarmony(self):
+        return 0
+
+    def setHarmony(self, harmony):
+        pass
+
+    def getChord(self):
+        return ()
+
+    def getShift(self):
+        return self.store.harmony_shifts[self.index]
+
+    def setShift(self, shift):
+        self.store.harmony_shifts[self.index] = shift
+
+    pitch = property(getPitch, setPitch)
+    duration = property(getDuration, setDuration)
+    harmony = property(getHarmony, setHarmony)
+    shift = property(getShift, setShift)
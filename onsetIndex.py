@@ -0,0 +1,155 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+import bisect
+
+
+class OnsetIndex(object):
+    '''
+    The OnsetIndex finds the notes of a staff by their time from the beginning
+    of the piece, instead of by their bar and position in the bar. All the
+    times are in ticks, so for example the 1234th quarter note beat starts at
+    tick 1233 * QUARTER (see ticks.py).
+
+    The start of each bar comes from the meter table of the staff. Within a
+    bar, the starts of the notes are kept as a prefix sum of their durations,
+    worked out when the bar is first searched. A note is then found with two
+    binary searches: one for the bar, and one for the note in the bar.
+
+    The prefix sums of a bar are thrown away whenever the bar is marked as
+    changed (see Staff.markDirty()), so after the staff has been straightened
+    only the bars that were actually changed are summed up again. The index
+    assumes that the staff is straight, so that no bar is overly full.
+    '''
+
+    '''
+                                -Initializer-
+        PARAMETERS:
+            -the Staff object whose notes are indexed
+    '''
+    def __init__(self, staff):
+        self.staff = staff
+
+        #The prefix sums of the bars by their index: the start of each note
+        #counted from the start of the bar, and the end of the last note
+        self.bar_onsets = {}
+
+    '''
+                                -markStale-
+        This function throws away the prefix sums of a bar, so that they are
+        worked out again when needed.
+
+        PARAMETERS:
+            -the index of the bar (starting from 0)
+    '''
+    def markStale(self, barNo):
+        self.bar_onsets.pop(barNo, None)
+
+    def clear(self):
+        self.bar_onsets.clear()
+
+    '''
+                                -barOnsets-
+        This function gives the prefix sums of a bar
+
+        PARAMETERS:
+            -the index of the bar
+
+        RETURNS:
+            -the start of each note of the bar, counted from the start of the
+                bar, followed by the end of the last note
+    '''
+    def barOnsets(self, barNo):
+        onsets = self.bar_onsets.get(barNo)
+        if onsets is None:
+            onsets = [0]
+            for note in self.staff.notes[barNo]:
+                onsets.append(onsets[-1] + note.getDuration())
+            self.bar_onsets[barNo] = onsets
+        return onsets
+
+    '''
+                                -onset-
+        This function gives the start of a note
+
+        PARAMETERS:
+            -the index of the bar, and the index of the note in the bar
+
+        RETURNS:
+            -the start of the note in ticks from the beginning of the piece
+    '''
+    def onset(self, barNo, noteNo):
+        return self.staff.meters.barStart(barNo) + self.barOnsets(barNo)[noteNo]
+
+    '''
+                                -locate-
+        This function finds the note sounding at a point in time
+
+        PARAMETERS:
+            -the time in ticks from the beginning of the piece
+
+        RETURNS:
+            -the index of the bar and the index of the note in the bar, as a
+                tuple, or None if no note is sounding then (the time is in the
+                unfilled part of a bar, or outside of the staff)
+    '''
+    def locate(self, tick):
+        if tick < 0:
+            return None
+        barNo = self.staff.meters.barAt(tick)
+        if barNo >= len(self.staff.notes):
+            return None
+        onsets = self.barOnsets(barNo)
+        offset = tick - self.staff.meters.barStart(barNo)
+        if offset >= onsets[-1]:
+            return None
+        return barNo, bisect.bisect_right(onsets, offset) - 1
+
+    '''
+                                -noteAt-
+        This function gives the note sounding at a point in time
+
+        PARAMETERS:
+            -the time in ticks from the beginning of the piece
+
+        RETURNS:
+            -the Note object, or None if no note is sounding then
+    '''
+    def noteAt(self, tick):
+        position = self.locate(tick)
+        if position is None:
+            return None
+        barNo, noteNo = position
+        return self.staff.notes[barNo][noteNo]
+
+    '''
+                                -notesBetween-
+        This function finds all the notes that sound during a span of time,
+        including the ones that started before it or end after it.
+
+        PARAMETERS:
+            -the start of the span in ticks from the beginning of the piece
+            -the end of the span (the first tick after it)
+
+        RETURNS:
+            -a list of (start of the note, index of the bar, index of the note
+                in the bar) tuples, in order
+    '''
+    def notesBetween(self, start, end):
+        found = []
+        start = max(start, 0)
+        if end <= start:
+            return found
+        lastBar = min(self.staff.meters.barAt(end - 1), len(self.staff.notes) - 1)
+        for barNo in range(self.staff.meters.barAt(start), lastBar + 1):
+            bar_start = self.staff.meters.barStart(barNo)
+            onsets = self.barOnsets(barNo)
+
+            #Skip the notes of the bar that have ended before the span
+            noteNo = max(bisect.bisect_right(onsets, start - bar_start) - 1, 0)
+            while noteNo < len(onsets) - 1 and bar_start + onsets[noteNo] < end:
+                if bar_start + onsets[noteNo + 1] > start:
+                    found.append((bar_start + onsets[noteNo], barNo, noteNo))
+                noteNo += 1
+        return found
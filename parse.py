@@ -2,14 +2,91 @@
 @author: Timo Vehvilainen
 '''
 from __future__ import division
-from staff import Staff
+from score import Score
 from note import Note 
 from corruptedFileError import CorruptedFileError
+from ticks import WHOLE, QUARTER, toTicks
+from lineReader import LineReader
 import sys
 
+'''
+                            -calculatePitch-
+    This function calculates the numeric value of a pitch name, where
+    g2 = 0, f2 = 1, e2 = 2 ..., d1 = 10 and c1 = 11. Any pitch outside of this
+    range is a rest (20).
+    
+    PARAMETERS:
+        -The pitch in string format. For example "c2" or "gb"
+    
+    RETURNS:
+        -The numeric value of the pitch
+'''
+
+def calculatePitch(pitch):
+    #Handle different octaves
+    if pitch[-1].isdigit():
+        octave = int(pitch[-1])
+    else:
+        octave = 1
+    
+    #Change the pitch letter to a numeric value
+    pitch_number = (ord(pitch[0]) - ord('g')) * (-1)
+    if pitch_number > 4:
+        octave += 1
+    pitch_number += 7 * (2-octave)
+    
+    if pitch_number < 0 or pitch_number > 11:
+        pitch_number = 20
+    
+    return pitch_number
+
+'''
+                            -calculateShift-
+    This function calculates the shift of a pitch name
+    
+    PARAMETERS:
+        -The pitch in string format. For example "c#2" or "gb"
+    
+    RETURNS:
+        -The numeric value of the shift. (1 for sharp, -1 for flat, 0 otherwise)
+'''
+
+def calculateShift(pitch):
+    #Handle sharp and flat notes
+    shift = 0
+    if len(pitch) >= 2:
+        if pitch[1] == "#":
+            shift = 1
+        elif pitch[1] == "b":
+            shift = -1
+    
+    return shift
+
+'''
+    The pitch names that can appear in a file (from "cb1" to "g#2", with or
+    without the octave, and "rest") are converted once, when the module is
+    loaded. The converted durations are remembered as they are read, up to
+    DURATION_CACHE_SIZE different ones.
+'''
+
+PITCH_NAMES = ["rest"]
+for letter in "abcdefg":
+    for accidental in ["", "#", "b"]:
+        for octave in ["", "1", "2"]:
+            PITCH_NAMES.append(letter + accidental + octave)
+
+PITCH_TABLE = dict((name, calculatePitch(name)) for name in PITCH_NAMES)
+SHIFT_TABLE = dict((name, calculateShift(name)) for name in PITCH_NAMES)
+
+DURATION_CACHE_SIZE = 256
+DURATION_CACHE = {}
+
 class Parse(object):
     '''
     The Parse class is used to handle the input given by the user.
+    
+    The whole file is read into a Score, and staff is the staff of its first
+    part, which is the one edited in the console interface.
     '''
     
     '''
@@ -17,12 +94,22 @@ class Parse(object):
     
     PARAMETERS:
         -the input stream
+        -True if a CorruptedFileError should be raised to the caller instead
+            of being reported and ignored (defaults to False)
     '''
-    def __init__(self, input):
+    def __init__(self, input, strict = False):
         
         #If no name, author, bar amount or time signature are provided in the file,
         # they are defaulted to "None", "None", 4 and 4/4. 
-        self.staff = Staff("None", "None", 4, 4/4)
+        self.score = Score("None", "None", 4, WHOLE)
+        self.staff = self.score.parts[0]
+        
+        #The part that the notes and lyrics sections are read into. Each
+        #notes section after the first one starts a new part.
+        self.part = None
+        
+        #The stream is read in large chunks instead of line by line
+        input = LineReader(input)
         
         try:
             line = self.getNextLine(input)
@@ -30,22 +117,50 @@ class Parse(object):
             if line.strip() != "#SHEETMUSIC":
                 raise CorruptedFileError("Unknown data file (missing header)")
             
+            #Each section handler returns the line that ended its section,
+            #which is the header of the next section, in any order
             line = self.getNextLine(input)
-            while line != "" and line != "#END":
+            while line != "" and line.strip().upper() != "#END":
                 line = line.strip().upper()
                 if line == "#SONG INFO":
                     line = self.handleInfo(input)
-                if line == "#TIME":
+                elif line == "#TIME":
                     line = self.handleTime(input)
-                if line  == "#NOTES":
+                elif line  == "#NOTES":
                     line = self.handleNotes(input)
-                if line == "#LYRICS":
+                elif line == "#LYRICS":
                     line = self.handleLyrics(input)
-                line = self.getNextLine(input)
+                else:
+                    line = self.getNextLine(input)
             
         #If the file is faulty in some way, raise an error
         except CorruptedFileError as e:
+            if strict:
+                raise
             print("Corrupted file error:", e)
+        
+        #Any lyrics given later (in the console interface) go to the first part
+        self.part = None
+    
+    '''
+                                -fromStaff-
+        This function makes a Parse object for editing a staff that has already
+        been read in some other way (for example, opened from a binary score
+        file), without parsing any input.
+        
+        PARAMETERS:
+            -the Staff object
+            
+        RETURNS:
+            -the Parse object
+    '''
+    @classmethod
+    def fromStaff(cls, staff):
+        parse = cls.__new__(cls)
+        parse.score = Score.fromParts([staff])
+        parse.staff = staff
+        parse.part = None
+        return parse
                    
     '''
                             -handleInfo-
@@ -63,11 +178,11 @@ class Parse(object):
             
             if line.lower().startswith("author"):
                 author = line.split(":")[1].strip()
-                self.staff.setAuthor(author)
+                self.score.setAuthor(author)
             
             elif line.lower().startswith("title"):
                 title = line.split(":")[1].strip()
-                self.staff.setTitle(title)
+                self.score.setTitle(title)
             
             line = self.getNextLine(input)
         return line
@@ -77,9 +192,13 @@ class Parse(object):
             This function handles number of bars (initially) and the time
             signature. 
             
-            The time signature is stored as a floating point number, 
-            indicating how many whole notes fit into one bar. So for example, a
-            time signature of 1 = "4/4", and 0.75 = "3/4".
+            The time signature is stored as the number of ticks that fit into 
+            one bar. So for example, a time signature of "4/4" is 96 ticks, and
+            "3/4" is 72 ticks.
+            
+            The time signature can change in the middle of the song. A change
+            is given with the bar it starts from, for example
+            "signature : 3/4 @ bar 17", and lasts until the next change.
             
             PARAMETERS:
                 - the input stream
@@ -93,18 +212,31 @@ class Parse(object):
             
             if line.startswith("signature"): 
                 given_sig = line.split(":")[1].strip()
+                barNo = 1
+                if "@" in given_sig:
+                    given_sig, bar = given_sig.split("@", 1)
+                    given_sig = given_sig.strip()
+                    bar = bar.strip().lower()
+                    try:
+                        if not bar.startswith("bar"):
+                            raise ValueError
+                        barNo = int(bar[3:].strip())
+                    except ValueError:
+                        raise CorruptedFileError("Invalid bar number")
+                    if barNo < 1:
+                        raise CorruptedFileError("Invalid bar number")
                 try:
                     given_sig = self.convertTime(given_sig)
                 except:
                     raise CorruptedFileError("Invalid Time signature")
-                self.staff.setTime(given_sig)
+                self.score.addMeterChange(barNo - 1, given_sig)
             
             elif line.startswith("bars"):
                 try:
                     bars = int(line.split(":")[1].strip())
                 except ValueError:
                     raise CorruptedFileError("Invalid bar number")
-                self.staff.setLength(bars)
+                self.score.setLength(bars)
             
             line = self.getNextLine(input)
         return line
@@ -112,6 +244,8 @@ class Parse(object):
     '''
                             -handleNotes-
         This function is used to parse the note information in the stream.
+        The first #NOTES section goes to the first part of the score, and
+        each one after it to a new part.
         
         It converts the note names (such as 'g1' or 'eb2') to numeric information
         and feeds it to the staff object. 
@@ -122,10 +256,10 @@ class Parse(object):
         
         If the octave is not provided, it defaults to 1.
         
-        The duration of the notes is also parsed, as a floating point number, 
-        where a whole note has duration 1. 
+        The duration of the notes is also parsed, as a number of ticks, 
+        where a whole note has duration 96. 
         The longest duration possible is 3/2, and 
-        the shortest duration possible is 1/16. 
+        the shortest duration possible is 1/32. 
         
         PARAMETERS:
             - the input stream
@@ -135,17 +269,40 @@ class Parse(object):
     '''
     
     def handleNotes(self, input):
-        line = self.getNextLine(input)
+        if self.part is None:
+            self.part = self.staff
+        else:
+            self.part = self.score.addPart()
         
-        #a temporary array to hold all the notes
-        notes = []
+        #The notes are added to the staff as soon as they have been read
+        self.part.extend(self.readNotes(input))
+        return self.section_end
+    
+    '''
+                            -readNotes-
+        This generator reads the notes of the #NOTES section one at a time.
+        A note is given out once all of its lines (pitch, duration and harmony)
+        have been read, that is, when the next note or section begins. Each
+        harmony line adds another tone to the chord of the note.
+        
+        PARAMETERS:
+            - the input stream
+            
+        YIELDS:
+            - the Note objects in the section, in order
+    '''
+    
+    def readNotes(self, input):
+        line = self.getNextLine(input)
         
-        #if no duration is specified, it defaults to 1/4
-        duration = 1/4
+        #the note whose lines are being read
+        note = None
         
         while line != "" and (not line.startswith("#")):
             #Handle the pitch
             if line.lower().startswith("pitch"):
+                if note is not None:
+                    yield note
                 pitch = line.split(":")[1].strip().lower()
                 
                 #Handle sharp and flat notes
@@ -154,15 +311,23 @@ class Parse(object):
                 #Convert the pitch name to a numeric value
                 pitch_number = self.convertPitch(pitch)
                 
-                notes.append(Note(pitch_number, 1/4, 0, shift))
+                #if no duration is specified, it defaults to 1/4
+                note = Note(pitch_number, QUARTER, 0, shift)
                 
             #Handle the duration
             elif line.lower().startswith("duration"):
-                duration = self.convertTime((line.split(":")[1].strip()))
-                notes[-1].setDuration(duration)
+                if note is None:
+                    raise CorruptedFileError("Duration given before any pitch")
+                try:
+                    duration = self.convertTime(line.split(":")[1].strip())
+                except (ValueError, ZeroDivisionError):
+                    raise CorruptedFileError("Invalid duration")
+                note.setDuration(duration)
             
             #Handle the harmony
             elif line.lower().startswith("harmony"):
+                if note is None:
+                    raise CorruptedFileError("Harmony given before any pitch")
                 harmony_pitch = line.split(":")[1].strip().lower()
                 
                 #Handle sharp and flat notes
@@ -170,19 +335,23 @@ class Parse(object):
                 
                 #Convert the pitch name to a numeric value
                 harmony_pitch_number = self.convertPitch(harmony_pitch)
-                notes[-1].setHarmony(Note(harmony_pitch_number, duration, 0, harmony_shift))
+                if harmony_pitch_number != 20:
+                    note.addChordTone(harmony_pitch_number, harmony_shift)
                 
             line = self.getNextLine(input)
-            
-        for note in notes:
-            self.staff.addNote(note)
-        return line
+        
+        if note is not None:
+            yield note
+        
+        #the line that ended the section, to be returned by handleNotes()
+        self.section_end = line
     
     '''
                             -handleLyrics-
             This function simply reads in a line of lyrics, separating
             them into words and further into syllables, and passing them
-            to the staff as a 2D-array
+            to the staff as a 2D-array. The lyrics of a file go to the part
+            of the #NOTES section before them.
             
             PARAMETERS:
                 -the input stream
@@ -195,35 +364,34 @@ class Parse(object):
         line = self.getNextLine(input)
         words = []
         
+        #Each word is split into its syllables as soon as it is read
         while line != "" and (not line.startswith("#")):
-            new_line = line.split(" ")
-            for word in new_line:
-                words.append(word)
+            for word in line.split(" "):
+                words.append(word.split("-"))
             line = self.getNextLine(input)
         
-        word_amount = len(words)
-        for i in range(word_amount):
-            syllables = words[0].split("-")
-            words.append(syllables)
-            words.pop(0)
-        self.staff.setLyrics(words)
+        if self.part is None:
+            self.staff.setLyrics(words)
+        else:
+            self.part.setLyrics(words)
         
         return line
     
     '''
                             -modifyNote-
         This function is used to modify a single selected note in the console
-        interface.
+        interface. The notes are numbered as they are drawn, so the rests that
+        fill up the end of the bar can be selected too (see selectNote()).
         
         PARAMETERS:
             -The ordinal number of the bar (positive integer)
-            -The ordinal number of the note within the bar (positive integer)
+            -The ordinal number of the note within the bar, counting the
+                drawn rests (positive integer)
             -The pitch of the note in the format "f1" or "c#2" for example (a string)
             -The duration of the in the format "1/4" or "0.25" for example (a string)
     '''
     def modifyNote(self, barNo, noteNo, pitch, duration):
-        bar = self.staff.notes[barNo-1]
-        note = bar[noteNo-1]
+        note = self.selectNote(barNo, noteNo)
         
         shiftNo = self.convertShift(pitch)
         pitchNo = self.convertPitch(pitch)
@@ -233,25 +401,50 @@ class Parse(object):
         note.setShift(shiftNo)
         note.setDuration(durationNo)
         
-        self.staff.straightenStaff()
+        #Only the modified bar and the bars it spills over into are straightened
+        self.staff.reflowFrom(barNo-1)
         
         '''
                                 -addHarmony
-            This function is used to add harmony to a note
+            This function is used to add harmony to a note. Each call adds
+            another tone to the chord of the note.
             
             PARAMETERS:
                 -the ordinal number of the bar of the note (positive integer)
-                -the ordinal number of the note in the bar (positive integer)
+                -the ordinal number of the note in the bar, counting the
+                    drawn rests (positive integer)
                 -the pitch of the harmony (string)
         '''
         
     def addHarmony(self, barNo, noteNo,  pitch):
-        bar = self.staff.notes[barNo-1]
-        note = bar[noteNo-1]
+        note = self.selectNote(barNo, noteNo)
 
         pitchNo = self.convertPitch(pitch) 
         shift = self.convertShift(pitch) 
-        note.setHarmony(Note(pitchNo, note.getDuration(), 0, shift))
+        if pitchNo != 20:
+            note.addChordTone(pitchNo, shift)
+        self.staff.markDirty(barNo-1)
+    
+    '''
+                            -selectNote-
+        This helper function gives a note of the first part, as numbered when
+        it is drawn. If the note is one of the rests that are only drawn to
+        fill up the bar, the rests are added to the notes of the bar first.
+        
+        PARAMETERS:
+            -the ordinal number of the bar (positive integer)
+            -the ordinal number of the note in the bar, counting the drawn
+                rests (positive integer)
+        
+        RETURNS:
+            -the Note object
+    '''
+    def selectNote(self, barNo, noteNo):
+        bar = self.staff.notes[barNo-1]
+        if noteNo > len(bar):
+            self.staff.fillBar(barNo-1)
+        return bar[noteNo-1]
+    
     '''
                             -editInfo-
         This function is used to edit the info of the song in the console interface.
@@ -265,22 +458,28 @@ class Parse(object):
     def editInfo(self, title, author, time, length):
         time_sig = self.convertTime(time)
         
-        self.staff.setTitle(title)
-        self.staff.setAuthor(author)
-        self.staff.setLength(length)
-        self.staff.setTime(time_sig)
+        self.score.setTitle(title)
+        self.score.setAuthor(author)
+        self.score.setLength(length)
         
-        self.staff.straightenStaff()
+        #The notes themselves don't change, so the parts only need to be
+        #straightened again if the bars got shorter
+        if time_sig != self.score.time:
+            shorter = time_sig < self.score.time
+            self.score.setTime(time_sig)
+            if shorter:
+                self.score.layout()
         
         
     '''
                             -printStaff-
         This function is meant to be called for printing the staff in its current
-        state. It merely advances the call to staff.py
+        state, along with the other parts of the score. It merely advances the
+        call to score.py
     '''
 
-    def printStaff(self, out = sys.stdout):
-        self.staff.printStaff(out)
+    def printStaff(self, out = sys.stdout, barsPerSystem = None):
+        self.score.printScore(out, barsPerSystem)
         
         '''
                             -getNextLine-
@@ -289,13 +488,16 @@ class Parse(object):
         It is then stripped of excess whitespace for ease of handling.
             
         PARAMETERS:
-            -the input stream
+            -the input stream (or a LineReader reading it)
             
         RETURNS:
             -the next line in the input that has some content in it, stripped.
         '''
 
     def getNextLine(self, input):
+        if isinstance(input, LineReader):
+            return input.nextLine()
+        
         line = " "
         while line.isspace():
             line = input.readline()
@@ -305,23 +507,28 @@ class Parse(object):
     '''
                             -convertTime-
         This helper function is used by handleTime() to read in the time signature
-        either as a floating point number, or a quotient of two numbers.
+        either as a decimal number, or a quotient of two numbers.
+        
+        The same few durations appear over and over again in a file, so the
+        converted values are remembered in DURATION_CACHE.
         
         PARAMETERS:
             -The time signature as a string (either a quotient of the form "X/Y",
-                or a floating point number)
+                or a decimal number)
         
         RETURNS:
-            -The time signature as a floating point number, indicating how many
-                 whole notes fit in one bar.
+            -The time signature as a number of ticks, indicating how many
+                 ticks fit in one bar.
     '''
     
     def convertTime(self, time):
-        try:
-            return float(time)
-        except ValueError:
-            num, denom = time.split('/')
-            return (float(num) / float(denom))
+        ticks = DURATION_CACHE.get(time)
+        if ticks is None:
+            ticks = toTicks(time)
+            if len(DURATION_CACHE) >= DURATION_CACHE_SIZE:
+                DURATION_CACHE.clear()
+            DURATION_CACHE[time] = ticks
+        return ticks
         
     '''
                             -convertPitch-
@@ -329,6 +536,9 @@ class Parse(object):
         g2 = 0, f2 = 1, e2 = 2 ..., d1 = 10 and c1 = 11. Any sharps or flats are ignored, 
         as they are handled separately by convertShift().
         
+        The value is looked up from PITCH_TABLE, and only calculated for names
+        that aren't in it.
+        
         PARAMETERS:
             -The pitch in string format. For example "c2" or "gb"
         
@@ -337,21 +547,9 @@ class Parse(object):
     '''
         
     def convertPitch(self, pitch):
-        #Handle different octaves
-        if pitch[-1].isdigit():
-            octave = int(pitch[-1])
-        else:
-            octave = 1
-        
-        #Change the pitch letter to a numeric value
-        pitch_number = (ord(pitch[0]) - ord('g')) * (-1)
-        if pitch_number > 4:
-            octave += 1
-        pitch_number += 7 * (2-octave)
-        
-        if pitch_number < 0 or pitch_number > 11:
-            pitch_number = 20
-        
+        pitch_number = PITCH_TABLE.get(pitch)
+        if pitch_number is None:
+            pitch_number = calculatePitch(pitch)
         return pitch_number
     
     '''
@@ -366,13 +564,7 @@ class Parse(object):
     '''
     
     def convertShift(self, pitch):
-        #Handle sharp and flat notes
-        shift = 0
-        if len(pitch) >= 2:
-            if pitch[1] == "#":
-                shift = 1
-            elif pitch[1] == "b":
-                shift = -1
-        
+        shift = SHIFT_TABLE.get(pitch)
+        if shift is None:
+            shift = calculateShift(pitch)
         return shift
-        
\ No newline at end of file
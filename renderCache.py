@@ -0,0 +1,168 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+from lineReader import CHUNK_SIZE
+import hashlib
+import os
+
+'''
+    The render cache keeps the printed staves of score files on disk, so that
+    a score file that hasn't changed doesn't have to be parsed and drawn again.
+
+    Each entry is a file in the cache folder, named after a hash of the score
+    file, RENDERER_VERSION and the render options. Using an entry touches its
+    file, and when the folder has grown over its size limit, evict() removes
+    the entries that were used the longest time ago. Since that goes through
+    the whole folder, it is done once after a batch of entries has been stored
+    (see batch.py), not after every entry.
+'''
+
+#This must be increased whenever a change to the program changes the way
+#staves are printed, so that old entries aren't used anymore
+RENDERER_VERSION = 3
+
+#The default size limit of the cache folder in bytes
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+ENTRY_SUFFIX = ".render"
+
+'''
+                            -cacheKey-
+    This function gives the key of a score file in the cache
+
+    PARAMETERS:
+        -The name of the score file
+        -A dictionary of the render options (such as the number of bars
+            in each system)
+
+    RETURNS:
+        -The key as a string of hexadecimal digits
+'''
+
+def cacheKey(filename, options):
+    key = hashlib.sha1()
+    key.update(("%d\n" % RENDERER_VERSION).encode("ascii"))
+    for name in sorted(options):
+        key.update(("%s=%r\n" % (name, options[name])).encode("utf-8"))
+
+    score_file = open(filename, "rb")
+    try:
+        chunk = score_file.read(CHUNK_SIZE)
+        while chunk:
+            key.update(chunk)
+            chunk = score_file.read(CHUNK_SIZE)
+    finally:
+        score_file.close()
+    return key.hexdigest()
+
+
+class RenderCache(object):
+    '''
+    The RenderCache is the folder of cached printed staves, along with the
+    number of hits and misses of this RenderCache object.
+    '''
+
+    '''
+                                -Initializer-
+        PARAMETERS:
+            -the cache folder (created if it doesn't exist)
+            -the size limit of the folder in bytes (defaults to DEFAULT_CACHE_SIZE)
+    '''
+    def __init__(self, folder, max_size = DEFAULT_CACHE_SIZE):
+        self.folder = folder
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(folder):
+            try:
+                os.makedirs(folder)
+            except OSError:
+                #Another process might have just created it
+                if not os.path.isdir(folder):
+                    raise
+
+    '''
+                                -entryName-
+        This helper function gives the name of the file of a cache entry
+    '''
+    def entryName(self, key):
+        return os.path.join(self.folder, key + ENTRY_SUFFIX)
+
+    '''
+                                -get-
+        This function gives the cached printed staff of a key, and marks
+        the entry as recently used.
+
+        PARAMETERS:
+            -the key (from cacheKey())
+
+        RETURNS:
+            -the printed staff as a string, or None if it isn't in the cache
+    '''
+    def get(self, key):
+        name = self.entryName(key)
+        try:
+            entry = open(name, "r")
+            try:
+                text = entry.read()
+            finally:
+                entry.close()
+            os.utime(name, None)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text
+
+    '''
+                                -put-
+        This function stores a printed staff in the cache. The old entries
+        aren't removed here, so evict() has to be called afterwards.
+
+        PARAMETERS:
+            -the key (from cacheKey())
+            -the printed staff as a string
+    '''
+    def put(self, key, text):
+        name = self.entryName(key)
+
+        #The entry is written into a temporary file first, so that other
+        #processes never read a half-written entry
+        temporary = "%s.%d.tmp" % (name, os.getpid())
+        entry = open(temporary, "w")
+        try:
+            entry.write(text)
+        finally:
+            entry.close()
+        os.rename(temporary, name)
+
+    '''
+                                -evict-
+        This function removes the least recently used entries until the
+        cache folder fits in its size limit.
+    '''
+    def evict(self):
+        entries = []
+        total_size = 0
+        for filename in os.listdir(self.folder):
+            if not filename.endswith(ENTRY_SUFFIX):
+                continue
+            name = os.path.join(self.folder, filename)
+            try:
+                info = os.stat(name)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, name))
+            total_size += info.st_size
+
+        entries.sort()
+        for mtime, size, name in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(name)
+            except OSError:
+                #Another process might have removed it already
+                pass
+            total_size -= size
@@ -0,0 +1,222 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+from __future__ import print_function
+from staff import Staff
+from glyphs import getGlyph
+from meterTable import MeterTable
+from ticks import formatTicks
+import sys
+
+'''
+    A Score holds the parts of an ensemble: a Staff for each part, all sharing
+    the song info and the time signature. In the #SHEETMUSIC format each #NOTES
+    section starts a new part, and a #LYRICS section belongs to the part of
+    the #NOTES section before it.
+
+    The parts are laid out independently of each other. When the score is
+    printed, the parts are stacked into systems, and the bars of each system
+    are padded so that they line up across the parts.
+'''
+
+
+class Score(object):
+    '''
+    The Score object represents a piece of sheet music with one or more parts,
+    each on its own staff
+    '''
+
+    '''
+                            -Initializer-
+        The score starts with a single, empty part.
+
+        PARAMETERS:
+            -title of the song (a string)
+            -author of the song (a string)
+            -the lenght of the song in bars (a positive integer)
+            -the time signature of the song (the length of a bar in ticks)
+    '''
+
+    def __init__(self, title, author, lengthInBars, time_sig):
+        self.title = title
+        self.author = author
+        self.length = lengthInBars
+        self.time = time_sig
+        self.meters = MeterTable(time_sig)
+        self.parts = [Staff(title, author, lengthInBars, time_sig)]
+
+    '''
+                                -fromParts-
+        This function creates a score out of staves that have already been
+        read. The song info and the time signature are taken from the first
+        staff.
+
+        PARAMETERS:
+            -the Staff objects of the parts (at least one)
+
+        RETURNS:
+            -The new Score object
+    '''
+    @classmethod
+    def fromParts(cls, parts):
+        first = parts[0]
+        score = cls(first.title, first.author, first.length, first.time)
+        for barNo, time in first.meters.laterChanges():
+            score.meters.addChange(barNo, time)
+        score.parts = list(parts)
+        score.alignLengths()
+        return score
+
+    '''
+        SET-FUNCTIONS
+        The song info and the time signature are shared by all the parts.
+    '''
+
+    def setAuthor(self, author):
+        self.author = author
+        for part in self.parts:
+            part.setAuthor(author)
+
+    def setTitle(self, title):
+        self.title = title
+        for part in self.parts:
+            part.setTitle(title)
+
+    def setLength(self, length):
+        self.length = length
+        for part in self.parts:
+            part.setLength(length)
+
+    def setTime(self, time):
+        self.time = time
+        self.meters.setTime(time)
+        for part in self.parts:
+            part.setTime(time)
+    
+    def addMeterChange(self, barNo, time):
+        if barNo == 0:
+            self.setTime(time)
+            return
+        self.meters.addChange(barNo, time)
+        for part in self.parts:
+            part.addMeterChange(barNo, time)
+
+    '''
+                                -addPart-
+        This function adds a new, empty part at the bottom of the score.
+
+        RETURNS:
+            -The Staff object of the new part
+    '''
+    def addPart(self):
+        part = Staff(self.title, self.author, self.length, self.time)
+        for barNo, time in self.meters.laterChanges():
+            part.addMeterChange(barNo, time)
+        self.parts.append(part)
+        return part
+
+    '''
+                                -alignLengths-
+        This function adds empty bars to the end of the parts that are shorter
+        than the others, so that all the parts end together.
+    '''
+    def alignLengths(self):
+        self.length = max([part.length for part in self.parts])
+        for part in self.parts:
+            if part.length < self.length:
+                part.setLength(self.length)
+
+    '''
+                                -layout-
+        This function straightens every part, for example after the time
+        signature has changed. The rests that fill up the bars aren't added
+        to the parts, since they are only drawn when the score is printed.
+
+        Each part is straightened in a single pass over its notes, so the
+        parts are laid out one after another in this process. Handing them to
+        worker processes would cost more in copying the notes there and back
+        than the pass itself; whole files are rendered in parallel instead
+        (see batch.py).
+    '''
+    def layout(self):
+        for part in self.parts:
+            part.straightenStaff()
+        self.alignLengths()
+
+    '''
+                                -printScore-
+        This function prints out the current condition of the score, with the
+        parts stacked into systems. A score with a single part is printed the
+        same way as its staff.
+
+        PARAMETERS:
+            -an output stream (defaults to sys.stdout)
+            -the number of bars in each system (defaults to all of them)
+            -the output stream for the song info (defaults to sys.stdout)
+    '''
+    def printScore(self, out = sys.stdout, barsPerSystem = None, info_out = None):
+        if info_out is None:
+            info_out = sys.stdout
+        self.alignLengths()
+        print ("Title:", self.title, file = info_out)
+        print ("Author:", self.author, file = info_out)
+        print ("Time Signature (amount of whole notes in a bar):", formatTicks(self.time), file = info_out)
+        if len(self.meters.effectiveChanges()) > 0:
+            print ("Time Signature changes:", self.meters.describeChanges(), file = info_out)
+        if len(self.parts) > 1:
+            print ("Parts:", len(self.parts), file = info_out)
+        print ("Length in bars:", self.length, "\n", file = info_out)
+
+        #Just like with a single staff, the drawn bars are only kept in the
+        #caches of the parts when the whole score is printed at once
+        for systemNo, system in enumerate(self.renderSystems(barsPerSystem, barsPerSystem is None)):
+            if systemNo > 0:
+                out.write("\n")
+            out.write(system)
+            if barsPerSystem is not None and not system.endswith("\n"):
+                out.write("\n")
+
+    '''
+                                -renderSystems-
+        This generator draws the score one system at a time. Each bar is
+        drawn as wide as the widest part needs it, so that the bar lines of
+        all the parts line up.
+
+        PARAMETERS:
+            -the number of bars in each system (defaults to all of them)
+            -True if the drawn bars should be stored in the caches of the
+                parts (defaults to True)
+
+        YIELDS:
+            -The text of each system: the systems of the parts, from the
+                first part to the last (without a line break at the end)
+    '''
+    def renderSystems(self, barsPerSystem = None, useCache = True):
+        self.alignLengths()
+        bar_count = len(self.parts[0].notes)
+        if barsPerSystem is None or barsPerSystem < 1:
+            barsPerSystem = max(bar_count, 1)
+
+        cleff_rows = getGlyph("G-cleff")
+
+        #The position in the lyrics of each part
+        positions = [(0, 0)] * len(self.parts)
+
+        for firstBar in range(0, max(bar_count, 1), barsPerSystem):
+            lastBar = min(firstBar + barsPerSystem, bar_count)
+            blocks = [part.barBlocks(firstBar, lastBar, useCache) for part in self.parts]
+            slots = []
+            for i in range(lastBar - firstBar):
+                slots.append(max([part.blockSlots(part_blocks[i])
+                                  for part, part_blocks in zip(self.parts, blocks)]))
+
+            systems = []
+            for partNo, part in enumerate(self.parts):
+                system, positions[partNo] = part.drawSystem(blocks[partNo], firstBar, lastBar,
+                                                            positions[partNo], cleff_rows, slots)
+                #Each part begins on a line of its own
+                if partNo < len(self.parts) - 1 and not system.endswith("\n"):
+                    system += "\n"
+                systems.append(system)
+            yield "".join(systems)
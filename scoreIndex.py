@@ -0,0 +1,114 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+import os
+from binaryScore import textToBinary, writeBinary, loadBinary
+from sheetWriter import writeSheet
+from corruptedFileError import CorruptedFileError
+
+'''
+    A score file in the #SHEETMUSIC format can be opened through an index:
+    a copy of the score in the binary score format, kept next to it in a file
+    with INDEX_SUFFIX added to its name. The index is built the first time the
+    score is opened, and built again whenever the score file is newer than it.
+
+    Opening a score through its index only reads the bar table, so it takes
+    the same time no matter how long the score is. The notes of a bar are
+    read when the bar is first used.
+'''
+
+INDEX_SUFFIX = ".idx"
+
+'''
+                            -indexName-
+    This function gives the name of the index file of a score file
+
+    PARAMETERS:
+        -The name of the score file
+
+    RETURNS:
+        -The name of the index file
+'''
+
+def indexName(filename):
+    return filename + INDEX_SUFFIX
+
+'''
+                            -isIndexCurrent-
+    This function tells if the index of a score file exists, and hasn't been
+    made out of date by changes to the score file.
+
+    PARAMETERS:
+        -The name of the score file
+
+    RETURNS:
+        -True if the index can be used, False if it has to be built again
+'''
+
+def isIndexCurrent(filename):
+    index = indexName(filename)
+    if not os.path.exists(index):
+        return False
+    return os.path.getmtime(index) >= os.path.getmtime(filename)
+
+'''
+                            -openIndexed-
+    This function opens a score file through its index, building the index
+    first if needed.
+
+    An index written by another version of the program is built again.
+
+    PARAMETERS:
+        -The name of the score file (in the #SHEETMUSIC format)
+
+    RETURNS:
+        -The Staff object, with its bars read lazily from the index
+
+    RAISES:
+        -IOError or OSError, if the score file can't be read or the index
+            can't be written next to it
+        -CorruptedFileError, if the score has several parts
+'''
+
+def openIndexed(filename):
+    if isIndexCurrent(filename):
+        try:
+            return loadBinary(indexName(filename))
+        except CorruptedFileError:
+            pass
+    textToBinary(filename, indexName(filename))
+    return loadBinary(indexName(filename))
+
+'''
+                            -saveIndexed-
+    This function saves a staff into a score file, and writes its index next
+    to it. The bars of the staff that were never read from the old index are
+    copied into the new one as they are.
+
+    The new index is written into a temporary file first, since the staff
+    might still be reading its bars from the old one.
+
+    PARAMETERS:
+        -The Staff object to be saved
+        -The name of the score file
+'''
+
+def saveIndexed(staff, filename):
+    index = indexName(filename)
+    temporary = index + ".tmp"
+
+    out = open(temporary, "wb")
+    writeBinary(staff, out)
+    out.close()
+
+    out = open(filename, "w")
+    writeSheet(staff, out)
+    out.close()
+
+    #The index is moved in place and touched after the score file has been
+    #written, so that it isn't older than the score
+    if os.path.exists(index):
+        os.remove(index)
+    os.rename(temporary, index)
+    os.utime(index, None)
@@ -0,0 +1,152 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+from ticks import formatTicks
+
+#The names of the pitches from 0 (g2) to 11 (c1), without the shift
+PITCH_NAMES = ["g2", "f2", "e2", "d2", "c2", "b1", "a1", "g1", "f1", "e1", "d1", "c1"]
+
+'''
+                            -pitchName-
+    This function gives the name of a pitch in the format read by Parse,
+    for example "c#2" or "eb1".
+
+    PARAMETERS:
+        -The numeric value of the pitch (0 to 11, or 20 for a rest)
+        -The shift of the pitch (1 for sharp, -1 for flat, 0 otherwise)
+
+    RETURNS:
+        -The name of the pitch as a string
+'''
+
+def pitchName(pitch, shift):
+    if pitch not in range(12):
+        return "rest"
+    name = PITCH_NAMES[pitch]
+    if shift > 0:
+        return name[0] + "#" + name[1]
+    elif shift < 0:
+        return name[0] + "b" + name[1]
+    return name
+
+'''
+                            -writeSheet-
+    This function writes a staff out in the #SHEETMUSIC format, so that it
+    can be read back in with Parse.
+
+    The notes are written bar by bar, so the parts of a note that was split
+    between bars are written as separate notes. A bar that isn't full (but
+    is followed by notes) is filled up with rests, so that the notes end up
+    in the same bars when the file is read back in.
+
+    PARAMETERS:
+        -The Staff object to be written
+        -The output stream
+'''
+
+def writeSheet(staff, out):
+    writeHeader(staff, out)
+    writePart(staff, out)
+    out.write("#END\n")
+
+'''
+                            -writeScore-
+    This function writes a score out in the #SHEETMUSIC format, with a #NOTES
+    section (and a #LYRICS section, if it has lyrics) for each part.
+
+    PARAMETERS:
+        -The Score object to be written
+        -The output stream
+'''
+
+def writeScore(score, out):
+    writeHeader(score, out)
+    for part in score.parts:
+        writePart(part, out)
+    out.write("#END\n")
+
+'''
+                            -writeHeader-
+    This helper function writes out the song info and the time sections
+
+    PARAMETERS:
+        -The Staff or Score object to be written
+        -The output stream
+'''
+
+def writeHeader(staff, out):
+    out.write("#SHEETMUSIC\n\n")
+
+    out.write("#SONG INFO\n")
+    out.write("title : %s\n" % staff.title)
+    out.write("author : %s\n\n" % staff.author)
+
+    out.write("#TIME\n")
+    out.write("bars : %d\n" % staff.length)
+    out.write("signature : %s\n" % formatTicks(staff.time))
+    for barNo, time in staff.meters.effectiveChanges():
+        out.write("signature : %s @ bar %d\n" % (formatTicks(time), barNo + 1))
+    out.write("\n")
+
+'''
+                            -writePart-
+    This helper function writes out the notes and the lyrics of a staff
+
+    PARAMETERS:
+        -The Staff object to be written
+        -The output stream
+'''
+
+def writePart(staff, out):
+    out.write("#NOTES\n\n")
+    lastBar = len(staff.notes) - 1
+    while lastBar >= 0 and len(staff.notes[lastBar]) == 0:
+        lastBar -= 1
+    for barNo in range(lastBar + 1):
+        bar = staff.notes[barNo]
+        for note in bar:
+            writeNote(note, out)
+        difference = staff.meters.barTime(barNo) - staff.addDurations(bar)
+        if barNo < lastBar and difference > 0:
+            for duration in staff.splitRest(difference):
+                out.write("pitch : rest\nduration : %s\n\n" % formatTicks(duration))
+
+    lyrics = lyricsText(staff.lyrics)
+    if lyrics != "":
+        out.write("#LYRICS\n")
+        out.write(lyrics + "\n\n")
+
+'''
+                            -writeNote-
+    This helper function writes out the lines of a single note, with a
+    harmony line for each tone of its chord
+
+    PARAMETERS:
+        -The Note object to be written
+        -The output stream
+'''
+
+def writeNote(note, out):
+    out.write("pitch : %s\n" % pitchName(note.getPitch(), note.getShift()))
+    out.write("duration : %s\n" % formatTicks(note.getDuration()))
+    for pitch, shift in note.getChord():
+        out.write("harmony : %s\n" % pitchName(pitch, shift))
+    out.write("\n")
+
+'''
+                            -lyricsText-
+    This helper function turns the lyrics of a staff back into a single line,
+    with syllables separated by '-' and words by a space.
+
+    PARAMETERS:
+        -the lyrics in a 2D-array (words on rows, syllables on columns)
+
+    RETURNS:
+        -the lyrics as a string
+'''
+
+def lyricsText(lyrics):
+    if len(lyrics) == 0 or len(lyrics[0]) == 0:
+        return ""
+    return " ".join(["-".join(word) for word in lyrics])
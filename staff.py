@@ -5,7 +5,14 @@
 from __future__ import division
 from __future__ import print_function
 from note import Note 
+from noteStore import NoteStore
+from lazyBars import LazyBars
+from meterTable import MeterTable
+from onsetIndex import OnsetIndex
+from glyphs import getGlyph
+from ticks import WHOLE, HALF, QUARTER, SIXTEENTH, DOTTED, WRITABLE, formatTicks, restDurations
 from corruptedFileError import CorruptedFileError
+from collections import deque
 import sys
 
 
@@ -21,7 +28,8 @@ class Staff(object):
             -title of the song (a string)
             -author of the song (a string)
             -the lenght of the song in bars (a positive integer)
-            -the time signature of the song (a floating point number)
+            -the time signature at the beginning of the song (the length of a
+                bar in ticks)
             -the lyrics of the song in a 2D-array (words on rows, syllables on columns)
     '''
 
@@ -33,11 +41,34 @@ class Staff(object):
         self.length = lengthInBars
         self.lyrics = lyrics
         
+        #The time signature of each bar, with any changes later in the song
+        self.meters = MeterTable(time_sig)
+        
         #The notes are stored in an 2D-array where each small array
         #represents a single bar
         self.notes = []
         for bar in range(self.length):
             self.notes.append([])
+        
+        #The summed up duration of each bar is kept alongside the notes, and
+        #open_bar points to the first bar that might not be full yet
+        self.bar_durations = [0] * self.length
+        self.open_bar = 0
+        
+        #The rendered column blocks of the bars are kept in bar_cache, so that
+        #only the bars that have changed since the last print are drawn again
+        self.bar_cache = {}
+        
+        #The lyrics under each cached bar are kept in lyrics_cache, along with
+        #the position in the lyrics they start from (see lyricsLine())
+        self.lyrics_cache = {}
+        
+        #The NoteStore the notes are kept in, for a staff made with fromStore()
+        self.store = None
+        
+        #The notes can also be found by their time from the beginning of the
+        #song. The index is kept up to date along with bar_cache.
+        self.onset_index = OnsetIndex(self)
     
     '''
         SET-FUNCTIONS
@@ -55,14 +86,84 @@ class Staff(object):
         self.length = length
         while len(self.notes) > length:
             self.notes.pop()
+            self.bar_durations.pop()
         while len(self.notes) < length:
             self.notes.append([])
+            self.bar_durations.append(0)
+        if self.open_bar > length:
+            self.open_bar = length
+        for cache in [self.bar_cache, self.lyrics_cache]:
+            for barNo in list(cache):
+                if barNo >= length:
+                    del cache[barNo]
+        for barNo in list(self.onset_index.bar_onsets):
+            if barNo >= length:
+                self.onset_index.markStale(barNo)
     
     def setTime(self, time):
         self.time = time
+        self.meters.setTime(time)
+        #Any bar might have room left after the change
+        self.open_bar = 0
+        self.markAllDirty()
+    
+    '''
+                                -addMeterChange-
+        This function changes the time signature from a bar onwards. The notes
+        aren't moved, so the staff has to be straightened afterwards if it
+        already has notes in or after the bar.
+        
+        PARAMETERS:
+            -The index of the bar (starting from 0)
+            -The new time signature in ticks
+    '''
+    def addMeterChange(self, barNo, time):
+        if barNo == 0:
+            self.setTime(time)
+            return
+        self.meters.addChange(barNo, time)
+        self.open_bar = min(self.open_bar, barNo)
+        self.markAllDirty()
+    
+    '''
+                                -barTime-
+        This function gives the length of a bar, according to the time
+        signature in effect in it.
+        
+        PARAMETERS:
+            -The index of the bar (starting from 0)
+        
+        RETURNS:
+            -The length of the bar in ticks
+    '''
+    def barTime(self, barNo):
+        return self.meters.barTime(barNo)
     
     def setLyrics(self, lyrics):
         self.lyrics = lyrics
+        self.lyrics_cache.clear()
+    
+    '''
+                                -markDirty-
+        This function marks a bar as changed, so that it is drawn again the
+        next time the staff is printed, and its notes are indexed again the
+        next time they are searched by time. It has to be called whenever the
+        notes of a bar are modified from outside the staff.
+        
+        PARAMETERS:
+            -The index of the bar (starting from 0)
+    '''
+    def markDirty(self, barNo):
+        self.bar_cache.pop(barNo, None)
+        self.lyrics_cache.pop(barNo, None)
+        self.onset_index.markStale(barNo)
+        if self.store is not None:
+            self.store.stale = True
+    
+    def markAllDirty(self):
+        self.bar_cache.clear()
+        self.lyrics_cache.clear()
+        self.onset_index.clear()
     
     '''
                                 -addNote-
@@ -73,14 +174,138 @@ class Staff(object):
             -The Note-object to be added 
     '''
     def addNote(self, noteNew):
-        barNo = 0
-        while barNo < self.length and (self.addDurations(self.notes[barNo])) >= self.time:
-            barNo += 1
-        if barNo == self.length:
-            self.setLength(self.length + 1)
-        self.notes[barNo].append(noteNew)
-        self.straightenStaff()
+        self.extend([noteNew])
+    
+    '''
+                                -extend-
+        This function adds a whole sequence of notes to the staff in one pass.
+        Each note goes to the end of the first bar that isn't full, and any
+        part of it that doesn't fit is pushed into the following bars, which
+        are created as needed.
+        
+        The first bar that isn't full is tracked with open_bar, so that the bars
+        before it don't need to be summed up again for every new note. Only the
+        bar the note went into (and the bars its overflow is pushed into) are
+        straightened afterwards.
+        
+        PARAMETERS:
+            -An iterable of Note-objects to be added, in order
+    '''
+    def extend(self, notes):
+        barNo = self.open_bar
+        for note in notes:
+            while barNo < self.length and self.bar_durations[barNo] >= self.meters.barTime(barNo):
+                barNo += 1
+            if barNo == self.length:
+                self.setLength(self.length + 1)
+            self.notes[barNo].append(note)
+            self.bar_durations[barNo] += note.getDuration()
+            self.markDirty(barNo)
+            
+            #Push the overflow forward until a bar is no longer overly full
+            self.reflow(barNo, True)
+        self.open_bar = barNo
+    
+    '''
+                                -fromNotes-
+        This function creates a new staff and lays out the given notes on it.
+        
+        PARAMETERS:
+            -title of the song (a string)
+            -author of the song (a string)
+            -the initial lenght of the song in bars (a positive integer)
+            -the time signature of the song (the length of a bar in ticks)
+            -an iterable of Note-objects to be added, in order
+        
+        RETURNS:
+            -The new Staff object
+    '''
+    @classmethod
+    def fromNotes(cls, title, author, lengthInBars, time_sig, notes):
+        staff = cls(title, author, lengthInBars, time_sig)
+        staff.extend(notes)
+        return staff
+        
+    '''
+                                -fromStore-
+        This function creates a new staff on top of a NoteStore. The bars of the
+        staff hold views to the arrays of the store instead of Note objects, so
+        the notes are read from and written to the store directly. The views of
+        a bar are only made when the bar is first used (see LazyBars), and the
+        durations of the bars are summed up from the store itself.
+        
+        Once the notes of a bar have been moved around, the store is marked as
+        stale (see markDirty()).
+        
+        PARAMETERS:
+            -title of the song (a string)
+            -author of the song (a string)
+            -the time signature of the song (the length of a bar in ticks)
+            -the NoteStore holding the notes
+        
+        RETURNS:
+            -The new Staff object
+    '''
+    @classmethod
+    def fromStore(cls, title, author, time_sig, store):
+        bars = LazyBars(store.barCount(), store.bar)
+        bar_durations = [store.barDuration(barNo) for barNo in range(store.barCount())]
+        staff = cls.fromBars(title, author, time_sig, bars, bar_durations)
+        staff.store = store
+        return staff
+    
+    '''
+                                -fromBars-
+        This function creates a new staff from bars that have already been laid
+        out, for example when loading a saved staff.
+        
+        PARAMETERS:
+            -title of the song (a string)
+            -author of the song (a string)
+            -the time signature of the song (the length of a bar in ticks)
+            -the bars (a list-like sequence of arrays of Note objects)
+            -the summed up duration of each bar (a list of integers)
+        
+        RETURNS:
+            -The new Staff object
+    '''
+    @classmethod
+    def fromBars(cls, title, author, time_sig, bars, bar_durations):
+        staff = cls(title, author, 0, time_sig)
+        staff.setBars(bars, bar_durations)
+        return staff
+    
+    '''
+                                -setBars-
+        This function replaces all the notes of the staff with bars that
+        have already been laid out.
         
+        PARAMETERS:
+            -the bars (a list-like sequence of arrays of Note objects)
+            -the summed up duration of each bar (a list of integers)
+    '''
+    def setBars(self, bars, bar_durations):
+        self.notes = bars
+        self.bar_durations = bar_durations
+        self.length = len(bars)
+        self.open_bar = 0
+        self.store = None
+        self.markAllDirty()
+    
+    '''
+                                -pack-
+        This function packs the notes of the staff into the parallel arrays of
+        a NoteStore, which takes much less memory than the Note objects. The
+        store the staff was made from is given as it is, unless it is stale.
+        
+        RETURNS:
+            -The NoteStore holding the notes of the staff
+    '''
+    def pack(self):
+        if self.store is not None and not self.store.stale:
+            return self.store
+        return NoteStore.fromStaff(self)
+    
     '''
                                 -addDurations-
         This helper function adds together all the durations of the notes
@@ -99,6 +324,42 @@ class Staff(object):
             duration += note.getDuration()
         return duration
     
+    '''
+                                -recountBars-
+        This helper function sums up the durations of every bar again. It is
+        used when the notes might have been modified from outside the staff
+        (for example, their durations changed), so that the running totals in
+        bar_durations can't be trusted anymore. Bars that haven't been read
+        from their file yet can't have been modified, so they aren't read.
+    '''
+    
+    def recountBars(self):
+        for barNo in range(len(self.notes)):
+            if self.isBarLoaded(barNo):
+                duration = self.addDurations(self.notes[barNo])
+                if duration != self.bar_durations[barNo]:
+                    self.bar_durations[barNo] = duration
+                    self.markDirty(barNo)
+        self.open_bar = 0
+    
+    '''
+                                -isBarLoaded-
+        This helper function tells if the notes of a bar are in memory. Only
+        the bars of a staff opened lazily from a file (see LazyBars) can be
+        left unread.
+        
+        PARAMETERS:
+            -The index of the bar
+            
+        RETURNS:
+            -True if the notes of the bar are in memory, False otherwise
+    '''
+    
+    def isBarLoaded(self, barNo):
+        if isinstance(self.notes, LazyBars):
+            return self.notes.isLoaded(barNo)
+        return True
+    
     '''
                             -straightenStaff-
         This helper function is used to deal with notes that are too long for the
@@ -108,95 +369,289 @@ class Staff(object):
     '''
     
     def straightenStaff(self):
-        # Overly full bars are handled as such:
-        #1. split the first note that crosses the set bar length into 2 parts
-        #2. insert all the extra notes from the overly filled bar into a temporary
-        #    array
-        #3. move all the extra notes from the temporary array to the beginning
-        #    of the next bar.
-        #4. Repeat this procedure for the next bar, creating new bars if necessary
+        self.recountBars()
+        self.reflow(0)
+    
+    '''
+                            -reflow-
+        This function straightens the staff in a single pass from the given bar
+        to the end. The notes that don't fit in a bar are carried forward, and
+        put in front of the notes of the next bar. A note that crosses the end of
+        a bar is split in two, and the second part is carried forward.
         
-        for barNo, bar in enumerate(self.notes):
+        Each bar holds as much as the time signature in effect in it allows
+        (see meterTable.py).
+        
+        Each bar is built only once, and a bar that isn't overly full and gets
+        nothing carried into it is skipped, so the pass is linear in the number
+        of notes. The carried notes are kept in a queue that the notes of each
+        overly full bar are added to, so even when a long run of notes is
+        carried through many bars, each note is only moved once into the queue
+        and once out of it. The summed durations in bar_durations must be up to
+        date.
+        
+        If the bars after the starting bar are known to be straight already,
+        the pass can stop at the first bar that nothing is carried out of,
+        since the rest of the staff stays as it was.
+        
+        PARAMETERS:
+            -The index of the bar to start from (defaults to 0)
+            -True if the pass should stop once nothing is carried forward
+                (defaults to False)
+    '''
+    
+    def reflow(self, startBar = 0, settle = False):
+        carry = deque()
+        carry_duration = 0
+        barNo = startBar
+        while barNo < self.length:
+            time = self.meters.barTime(barNo)
+            total = carry_duration + self.bar_durations[barNo]
+            if len(carry) == 0 and total <= time:
+                if settle:
+                    break
+                barNo += 1
+                continue
             
-            added_durations = 0
-            for i, note in enumerate(bar):
-                added_durations += note.getDuration()
+            bar = self.notes[barNo]
+            if total <= time:
+                #Everything fits, so the carried notes just go in front
+                bar[0:0] = carry
+                carry.clear()
+            else:
+                #The notes of the bar go behind the carried ones, and the bar
+                #is filled from the front of the queue
+                carry.extend(bar)
+                notes = []
+                added_durations = 0
+                while len(carry) > 0:
+                    note = carry[0]
+                    if added_durations + note.getDuration() > time:
+                        difference = added_durations + note.getDuration() - time
+                        if difference < note.getDuration():
+                            carry[0] = self.splitNote(note, difference)
+                            notes.append(note)
+                        break
+                    notes.append(carry.popleft())
+                    added_durations += note.getDuration()
+                bar[:] = notes
                 
-                if added_durations > self.time:
-                    difference = added_durations - self.time
-                    if difference < note.getDuration():  
-                        
-                        #Set the first half of the split not to the appropriate length
-                        note.setDuration(note.getDuration() - difference)
-                        if note.harmony != 0:
-                            note.getHarmony().setDuration(note.getDuration() - difference)
-                        
-                        #Create a new note, that has the rest of the split note
-                        new_note = Note(note.getPitch(), difference, note.getHarmony(), note.getShift())
-                        
-                        #See if the split note was the last note of the bar or not,
-                        #and use the proper function for adding the latter half
-                        if i == (len(bar) - 1):
-                            bar.append(new_note)
-                        else:
-                            bar.insert(i+1, new_note)
-                            
-                    #Move the extra notes into a temporary array
-                    extra_notes = []
-                    while self.addDurations(bar) > self.time:
-                        extra_notes.insert(0, bar.pop())
-                        
-                    #See if a new bar needs to be added
-                    if barNo == (self.length - 1):
-                        self.setLength(self.length + 1)
-                    
-                    #Insert the extra notes to the beginning of the next bar
-                    while len(extra_notes) > 0:
-                        self.notes[barNo+1].insert(0, extra_notes.pop())
-                        
+                #See if a new bar needs to be added
+                if barNo == (self.length - 1):
+                    self.setLength(self.length + 1)
+            
+            carry_duration = total - time if len(carry) > 0 else 0
+            self.bar_durations[barNo] = total - carry_duration
+            self.markDirty(barNo)
+            barNo += 1
+    
+    '''
+                            -reflowFrom-
+        This function straightens the staff after the notes of a single bar have
+        been modified, when the rest of the staff is straight. Only the bars the
+        modification spills over into are touched, so the time taken depends on
+        the size of the change instead of the length of the staff.
+        
+        PARAMETERS:
+            -The index of the modified bar
+    '''
+    
+    def reflowFrom(self, barNo):
+        self.bar_durations[barNo] = self.addDurations(self.notes[barNo])
+        #A note that got shorter leaves room in the bar for the notes added later
+        if self.bar_durations[barNo] < self.meters.barTime(barNo):
+            self.open_bar = min(self.open_bar, barNo)
+        self.markDirty(barNo)
+        self.reflow(barNo, True)
+    
+    '''
+                            -splitNote-
+        This helper function splits a note that crosses the end of a bar.
+        The note is shortened, and a new note with the same pitch and chord
+        is made of the part that is left over.
+        
+        PARAMETERS:
+            -The Note object to be split
+            -The duration of the part that is left over, in ticks
+        
+        RETURNS:
+            -The new Note object
+    '''
+    
+    def splitNote(self, note, difference):
+        #Set the first half of the split not to the appropriate length
+        note.setDuration(note.getDuration() - difference)
+        
+        #Create a new note, that has the rest of the split note
+        return Note(note.getPitch(), difference, 0, note.getShift(), note.getChord())
+    
     '''
                                 -printStaff-
         The main function used to print out the current condition of the staff
         
+        By default the whole staff is printed as one long system. If the number
+        of bars per system is given, the staff is instead wrapped into systems
+        of that many bars, and each system is written out as soon as it has
+        been drawn.
+        
         PARAMETERS:
             -an output stream (defaults to sys.stdout)
+            -the number of bars in each system (defaults to all of them)
+            -the output stream for the song info (defaults to sys.stdout)
     '''
-    def printStaff(self, out = sys.stdout):
-        print ("Title:", self.title)
-        print ("Author:", self.author)
-        print ("Time Signature (amount of whole notes in a bar):", self.time)
-        print ("Length in bars:", self.length, "\n")
+    def printStaff(self, out = sys.stdout, barsPerSystem = None, info_out = None):
+        if info_out is None:
+            info_out = sys.stdout
+        print ("Title:", self.title, file = info_out)
+        print ("Author:", self.author, file = info_out)
+        print ("Time Signature (amount of whole notes in a bar):", formatTicks(self.time), file = info_out)
+        if len(self.meters.effectiveChanges()) > 0:
+            print ("Time Signature changes:", self.meters.describeChanges(), file = info_out)
+        print ("Length in bars:", self.length, "\n", file = info_out)
         
-        self.reduceRests()
+        #The drawn bars are only kept in the cache when the whole staff is
+        #printed at once, so that wrapped printing of a long staff only needs
+        #to hold a single system in memory
+        for systemNo, system in enumerate(self.renderSystems(barsPerSystem, barsPerSystem is None)):
+            #Systems are separated by an empty line
+            if systemNo > 0:
+                out.write("\n")
+            out.write(system)
+            if barsPerSystem is not None and not system.endswith("\n"):
+                out.write("\n")
+    
+    '''
+                                -renderSystems-
+        This generator draws the staff one system at a time.
         
-        matrix = self.initializeMatrix()
-        matrix = self.insertNotes(matrix)
+        PARAMETERS:
+            -the number of bars in each system (defaults to all of them)
+            -True if the drawn bars should be stored in the cache (defaults to True)
+        
+        YIELDS:
+            -The text of each system: the rows of the staff, followed by
+                the lyrics under it (without a line break at the end)
+    '''
+    def renderSystems(self, barsPerSystem = None, useCache = True):
+        if barsPerSystem is None or barsPerSystem < 1:
+            barsPerSystem = max(len(self.notes), 1)
         
         #So that the program isn't too sensitive to the existence of the file containing
-        #the G-cleff, its non-existence is ignored by this try-except clause
-        try:
-            g_cleff = open("data/G-cleff.txt", "r")
-            for i in range(len(matrix)):
-                line = g_cleff.readline()[:-1]
-                out.write(line)
-                for j in matrix[i]:
-                    out.write(j)
-                out.write("\n")
-            g_cleff.close()
-            g_cleff = True
-        except IOError:
-            g_cleff = False
-            for i in range(len(matrix)):
-                for j in matrix[i]:
-                    out.write(j)
-                out.write("\n")
+        #the G-cleff, the staff is printed without it if it couldn't be loaded.
+        cleff_rows = getGlyph("G-cleff")
+        
+        #The position in the lyrics is carried over from one system to the next
+        lyrics_position = (0, 0)
+        
+        for firstBar in range(0, max(len(self.notes), 1), barsPerSystem):
+            lastBar = min(firstBar + barsPerSystem, len(self.notes))
+            blocks = self.barBlocks(firstBar, lastBar, useCache)
+            system, lyrics_position = self.drawSystem(blocks, firstBar, lastBar, lyrics_position, cleff_rows)
+            yield system
+    
+    '''
+                                -barBlocks-
+        This function gives the column blocks of a range of bars. Only the
+        bars missing from the cache are drawn.
+        
+        PARAMETERS:
+            -the index of the first bar, and the index after the last bar
+            -True if the drawn bars should be stored in the cache (defaults to True)
+        
+        RETURNS:
+            -The column blocks of the bars, as given by renderBar()
+    '''
+    def barBlocks(self, firstBar, lastBar, useCache = True):
+        blocks = []
+        for barNo in range(firstBar, lastBar):
+            block = self.bar_cache.get(barNo)
+            if block is None:
+                block = self.renderBar(barNo)
+                if useCache:
+                    self.bar_cache[barNo] = block
+            blocks.append(block)
+        return blocks
+    
+    '''
+                                -drawSystem-
+        This function puts a system together from the column blocks of its
+        bars, after a bar line at the very beginning of the system, and adds
+        the lyrics under it.
+        
+        When the staff is printed together with other staves (see score.py),
+        each bar can be given a number of note slots to fill, so that the bars
+        of all the staves line up. The bars with fewer notes are padded with
+        empty staff before their bar line.
+        
+        PARAMETERS:
+            -the column blocks of the bars, as given by barBlocks()
+            -the index of the first bar, and the index after the last bar
+            -the position in the lyrics to start from, as a tuple of the word
+                and syllable counts
+            -the rows of the G-cleff (None if it couldn't be loaded)
+            -the number of note slots of each bar (defaults to None, for
+                no padding)
+        
+        RETURNS:
+            -The text of the system (without a line break at the end)
+            -The position in the lyrics after the last bar
+    '''
+    def drawSystem(self, blocks, firstBar, lastBar, position, cleff_rows, slots = None):
+        g_cleff = cleff_rows is not None
+        if slots is not None:
+            blocks = [self.padBlock(block, slot) for block, slot in zip(blocks, slots)]
+        
+        lines = []
+        for row in range(13):
+            if row > 0 and row < 10:
+                line = b"|"
+            else:
+                line = b" "
+            line = str((line + b"".join([block[row] for block in blocks])).decode("ascii"))
+            if g_cleff and row < len(cleff_rows):
+                lines.append(cleff_rows[row] + line + "\n")
+            else:
+                lines.append(line + "\n")
         
         #Add lyrics separately
-        big_string = self.addLyrics(g_cleff)
-            
-        #Finally, write the string containing the lyrics
-        if big_string != "":
-            out.write(big_string)
+        big_string, position = self.lyricsLine(g_cleff, firstBar, lastBar, position, slots)
+        lines.append(big_string)
+        
+        return "".join(lines), position
+    
+    '''
+                                -blockSlots-
+        This helper function gives the number of note slots in the column
+        block of a bar. Each note and rest takes 5 columns, and so does the
+        bar line at the end.
+    '''
+    def blockSlots(self, block):
+        return len(block[0]) // 5 - 1
+    
+    '''
+                                -padBlock-
+        This helper function widens the column block of a bar to the given
+        number of note slots, by adding empty staff before the bar line.
+        
+        PARAMETERS:
+            -the column block, as given by renderBar()
+            -the number of note slots it should have
+        
+        RETURNS:
+            -the padded block (the same block if it is wide enough already)
+    '''
+    def padBlock(self, block, slots):
+        extra = slots - self.blockSlots(block)
+        if extra <= 0:
+            return block
+        padded = []
+        for row, line in enumerate(block):
+            if row % 2 != 0 and row <= 9:
+                fill = b"-"
+            else:
+                fill = b" "
+            padded.append(line[:-1] + fill * (5 * extra) + line[-1:])
+        return padded
     
     '''
                             -addLyrics-
@@ -211,216 +666,349 @@ class Staff(object):
     '''
             
     def addLyrics(self, g_cleff):
-        big_string = ""
-        #Construction of the lyrics in one big string, with syllables under each note
-        if len(self.lyrics[0]) != 0:
+        return self.lyricsLine(g_cleff, 0, len(self.notes), (0, 0))[0]
+    
+    '''
+                            -lyricsLine-
+        This is used for adding the lyrics under a range of bars. The lyrics
+        under a bar that is kept in bar_cache are kept as well, and used again
+        as long as the lyrics before the bar haven't changed.
+        
+        PARAMETERS:
+            -a True or False value, indicating whether the cleff was successfully
+            printed or not
+            -the index of the first bar, and the index after the last bar
+            -the position in the lyrics to start from, as a tuple of the word
+                and syllable counts
+            -the number of note slots of each bar, if the bars are padded
+                (defaults to None)
+        
+        RETURNS:
+            -The spaced out lyrics in a single string
+            -The position in the lyrics after the last bar
+    '''
+            
+    def lyricsLine(self, g_cleff, firstBar, lastBar, position, slots = None):
+        parts = []
+        #Construction of the lyrics out of the pieces under each bar, with
+        #syllables under each note
+        if len(self.lyrics) > 0 and len(self.lyrics[0]) != 0 and position[0] < len(self.lyrics):
             #Depending if the G-cleff was printed or not, offset the beginning of
             #the lyrics by 11 spaces
             if g_cleff == True:
-                big_string += "           "
-            syllable_count = 0
-            word_count = 0
-            for barNo, bar in enumerate(self.notes):
-                #5 spaces for each bar line
-                big_string += "    "
-                for i, note in enumerate(bar): 
-                    if note.getPitch() in range(12):
-                        #Add the next syllable to the string
-                        big_string += self.lyrics[word_count][syllable_count]
-                        #If it is not the last syllable of the word, add a hyphen
-                        if syllable_count < (len(self.lyrics[word_count]) - 1):
-                            big_string += "-"
-                        #Add spaces so that the distance to the next note is 5 spaces
-                        for j in range(5 - len(self.lyrics[word_count][syllable_count]) - 1):
-                            big_string += " "
-                        syllable_count += 1
-                        #If it was the last syllable of the word, go to the next word, 
-                        #and add an extra space instead of a hyphen
-                        if syllable_count == len(self.lyrics[word_count]):
-                            big_string += " "
-                            word_count += 1
-                            syllable_count = 0
-                        #End once we have printed the last word
-                        if word_count == len(self.lyrics):
-                            break
-                    else:
-                        #If the note is a rest, just add 5 spaces
-                        big_string += "     "
-                #Break from the upper loop aswell, when we are finished
+                parts.append("           ")
+            for barNo in range(firstBar, lastBar):
+                cached = self.lyrics_cache.get(barNo)
+                if cached is not None and cached[0] == position:
+                    segment, position, note_count = cached[1:]
+                else:
+                    start = position
+                    segment, position, note_count = self.barLyrics(barNo, position)
+                    if barNo in self.bar_cache:
+                        self.lyrics_cache[barNo] = (start, segment, position, note_count)
+                parts.append(segment)
+                #Break from the loop, when we are finished
+                if position[0] == len(self.lyrics):
+                    break
+                #Leave the padding of the bar empty
+                if slots is not None:
+                    parts.append(" " * (5 * (slots[barNo - firstBar] - note_count)))
+                parts.append(" ")
+        return "".join(parts), position
+    
+    '''
+                            -barLyrics-
+        This helper function lays out the lyrics under a single bar
+        
+        PARAMETERS:
+            -the index of the bar (starting from 0)
+            -the position in the lyrics to start from, as a tuple of the word
+                and syllable counts
+        
+        RETURNS:
+            -The spaced out lyrics of the bar, without the padding and the
+                bar line at the end
+            -The position in the lyrics after the bar
+            -The number of notes and rests drawn in the bar
+    '''
+    def barLyrics(self, barNo, position):
+        word_count, syllable_count = position
+        #5 spaces for each bar line
+        parts = ["    "]
+        layout = self.layoutBar(barNo)
+        for note, shift, chord_shifts in layout:
+            if note.getPitch() in range(12):
+                syllable = self.lyrics[word_count][syllable_count]
+                #Add the next syllable to the string
+                parts.append(syllable)
+                #If it is not the last syllable of the word, add a hyphen
+                if syllable_count < (len(self.lyrics[word_count]) - 1):
+                    parts.append("-")
+                #Add spaces so that the distance to the next note is 5 spaces
+                parts.append(" " * max(5 - len(syllable) - 1, 0))
+                syllable_count += 1
+                #If it was the last syllable of the word, go to the next word, 
+                #and add an extra space instead of a hyphen
+                if syllable_count == len(self.lyrics[word_count]):
+                    parts.append(" ")
+                    word_count += 1
+                    syllable_count = 0
+                #End once we have printed the last word
                 if word_count == len(self.lyrics):
-                            break
-                big_string += " "
-        return big_string
+                    break
+            else:
+                #If the note is a rest, just add 5 spaces
+                parts.append("     ")
+        return "".join(parts), (word_count, syllable_count), len(layout)
+        
+    '''
+                                -layoutBar-
+        This function works out what is drawn for a single bar, without
+        modifying the notes of the staff: the rests that fill up the rest of the
+        bar, and the sharp or flat that each note (and each tone of its chord)
+        is shown with. A sharp or a flat applies to the later notes of the same
+        pitch in the bar, until another sharp or flat is given for that pitch.
+        
+        PARAMETERS:
+            -The index of the bar (starting from 0)
         
+        RETURNS:
+            -A list with a (note, shift, chord shifts) tuple for each note and
+                rest to be drawn, where the chord shifts are the shifts of the
+                tones of the chord, in order
+    '''
+    def layoutBar(self, barNo):
+        bar = self.notes[barNo]
+        
+        #The sharp or flat in effect for each pitch, gathered in a single pass
+        #through the notes (and their chords) of the bar
+        accidentals = {}
+        layout = []
+        for note in bar:
+            shift = self.resolveShift(note.getPitch(), note.getShift(), accidentals)
+            chord_shifts = tuple([self.resolveShift(pitch, tone_shift, accidentals)
+                                  for pitch, tone_shift in note.getChord()])
+            layout.append((note, shift, chord_shifts))
+        
+        #Fill the unfilled part of the bar with rests
+        difference = self.meters.barTime(barNo) - self.addDurations(bar)
+        if difference > 0:
+            for duration in self.splitRest(difference):
+                layout.append((Note(20, duration), 0, 0))
+        return layout
+    
+    '''
+                                -resolveShift-
+        This helper function gives the shift a note (or a tone of a chord) is
+        shown with, and records its sharp or flat for the later notes of the bar.
+        
+        PARAMETERS:
+            -The pitch and the shift of the note
+            -The dictionary of the shift in effect for each pitch of the bar
+        
+        RETURNS:
+            -The shift the note is shown with
+    '''
+    def resolveShift(self, pitch, shift, accidentals):
+        if pitch == 20:
+            return shift
+        if shift != 0:
+            accidentals[pitch] = shift
+            return shift
+        return accidentals.get(pitch, 0)
+    
+    '''
+                                -renderBar-
+        This function draws a single bar into a column block, that can be
+        put together with the blocks of the other bars.
+        
+        PARAMETERS:
+            -The index of the bar (starting from 0)
+        
+        RETURNS:
+            -The rows of the block as byte strings, ending with the bar line
+    '''
+    def renderBar(self, barNo):
+        layout = self.layoutBar(barNo)
+        matrix = self.initializeMatrix(len(layout) + 1)
+        matrix = self.insertNotes(matrix, layout)
+        
+        #The first column only holds the bar line of the previous bar
+        return [bytes(row[1:]) for row in matrix]
+    
     '''
                                 -initializeMatrix-
-        This helper function creates a 2D-array (essentially a matrix)
-        of characters which, when printed out in sequence, produce the 
-        graphical representation of an empty staff (with no notes or rests).
+        This helper function creates the rows of characters (as bytearrays)
+        which, when printed out in sequence, produce the graphical
+        representation of an empty staff (with no notes or rests).
+        
+        PARAMETERS:
+            -the amount of notes and bar lines that need space on the staff
         
         RETURNS:
             -the initialized character matrix
     '''
-    def initializeMatrix(self):
+    def initializeMatrix(self, note_bar_amount):
         matrix = []
-        self.fillRests()
         #5 columns are needed for each note and bar line.
-        note_bar_amount = self.countNotesAndBars()
-        
+        width = note_bar_amount * 5 + 1
         for row in range(13):
-            matrix.append([])
-            for column in range(note_bar_amount * 5 + 1):
-                if (row % 2 != 0 and row <= 9):
-                    matrix[row].append("-")
-                else:
-                    matrix[row].append(" ")
+            if (row % 2 != 0 and row <= 9):
+                matrix.append(bytearray(b"-" * width))
+            else:
+                matrix.append(bytearray(b" " * width))
         return matrix
     
-    '''
-                            -countNotesAndBars-
-           This is used by InitializeMatrix() for counting enough space
-           for every note and barline.    
-           
-           RETURNS:
-               -an integer adding all the notes and bars together
-    '''
-    
-    def countNotesAndBars(self):
-        counter = 0
-        for bar in self.notes:
-            for note in bar:
-                counter += 1
-            counter += 1
-        return counter
-    
     '''
                                 -insertNotes-
-        This function is used by printStaff() to enter all the notes, rests
-        and bar lines to the staff.
+        This function is used by renderBar() to enter all the notes, rests
+        and bar lines of a bar to the staff.
         
         PARAMETERS:
             -the character matrix as initialized by initializeMatrix()
+            -the layout of the bar, as given by layoutBar()
             
         RETURNS:
             -the same matrix after the notes, rests, and bar lines have been added
     '''
     
-    def insertNotes(self, matrix):
+    def insertNotes(self, matrix, layout):
         column = 0
         
-        #Insert the first bar line at the very beginning of the staff
-        for j in range(len(matrix)):
-                if j > 0 and j < 10:
-                    matrix[j][column] = "|"
+        #Insert the bar line at the very beginning of the bar
+        for j in range(1, 10):
+            matrix[j][column:column+1] = b"|"
         
         
-        for barNo, bar in enumerate(self.notes):
-            for i, note in enumerate(bar):
-                
-                #The row of the matrix for each note is determined by the pitch,
-                #and 5 columns are reserved for each note
-                row = note.getPitch()
-                column += 5
-                
-                #if the pitch (or row) is not one of the accepted values, it is
-                #determined to be a rest.
-                if row == 20:
-                    self.insertRest(matrix, column, note)
-                    continue
-                
-                #Depending on the duration of the note, the head, the stem and 
-                #possibly the flag of the note might differ, so they are handled
-                #separately.
-                self.insertHead(matrix, row, column, note)
-                if note.getDuration() < 1:
-                    if note.getPitch() < 5:
-                        stem_direction = "down"
-                    else:
-                        stem_direction = "up"
-                    self.insertStem(matrix, row, column, note, stem_direction)
-                    if note.getDuration() < (1/4):
-                        self.insertFlag(matrix, row, column, note, stem_direction)
-                
-                if note.harmony != 0:
-                    self.insertHarmony(matrix, column, note)
-                #If the note is sharp or flat, we insert the appropriate marking,
-                #and place the same shift on all the other such notes in the same bar
-                if note.getShift() != 0:
-                    for other_note in bar:
-                        if other_note.getPitch() == note.getPitch():
-                            if other_note.getShift() == 0:
-                                other_note.setShift(note.getShift)
-                        harmony_note = other_note.getHarmony()
-                        if other_note.getHarmony() != 0:
-                            if harmony_note.getPitch() == note.getPitch():
-                                if harmony_note.getShift() == 0:
-                                    harmony_note.setShift(note.getShift)
-                    self.insertShift(matrix, row, column, note)
+        for note, shift, chord_shifts in layout:
+            
+            #The row of the matrix for each note is determined by the pitch,
+            #and 5 columns are reserved for each note
+            row = note.getPitch()
             column += 5
             
-            #After each bar, insert a vertical bar line
-            for j in range(len(matrix)):
-                if j > 0 and j < 10:
-                    matrix[j][column] = "|"
-                    
+            #if the pitch (or row) is not one of the accepted values, it is
+            #determined to be a rest.
+            if row == 20:
+                self.insertRest(matrix, column, note)
+                continue
+            
+            self.insertChord(matrix, column, note, shift, chord_shifts)
+        column += 5
+        
+        #After each bar, insert a vertical bar line
+        for j in range(1, 10):
+            matrix[j][column:column+1] = b"|"
+                
         return matrix
-    
+
     '''
-                            -insertHarmony-
-        Inserts the harmony notes to the matrix to be printed
+                            -insertChord-
+        This function is used by insertNotes() to draw a note together with the
+        other tones of its chord. All the heads share a single stem, which
+        runs through the chord and out from its top or bottom note.
         
         PARAMETERS:
-            - the character matrix as initialized by initilizeMatrix()
+            - the character matrix as initialized by initializeMatrix()
             - the column of the matrix that insertNotes() is currently going through
-            - the Note object, the harmony of which to be added
+            - the Note object to be added
+            - the shift the note is shown with (-1, 0 or 1)
+            - the shifts the tones of the chord are shown with
     '''
     
-    def insertHarmony(self, matrix, column, note):
-        harmony_note = note.getHarmony()
-        row = harmony_note.getPitch()
-        if row == 20:
-            return
-        self.insertHead(matrix, row, column, harmony_note)
-        if harmony_note.getDuration() < 1:
+    def insertChord(self, matrix, column, note, shift, chord_shifts):
+        tones = [(note.getPitch(), shift)]
+        for (pitch, tone_shift), shown_shift in zip(note.getChord(), chord_shifts):
+            if pitch != 20:
+                tones.append((pitch, shown_shift))
+        rows = set([row for row, tone_shift in tones])
+        top = min(rows)
+        bottom = max(rows)
+        
+        #Depending on the duration of the note, the heads, the stem and 
+        #possibly the flag of the note might differ, so they are handled
+        #separately.
+        for row in rows:
+            self.insertHead(matrix, row, column, note)
+        
+        if note.getDuration() < WHOLE:
+            #The stem points the way it would for the note alone, unless
+            #it wouldn't fit in the matrix that way
             if note.getPitch() < 5:
-                if harmony_note.getPitch() < 9:
-                    stem_direction = "down"
-                else:
-                    stem_direction = "up"
+                stem_direction = "down"
             else:
-                if harmony_note.getPitch() > 2:
-                    stem_direction = "up"
-                else:
-                    stem_direction = "down"
-            self.insertStem(matrix, row, column, harmony_note, stem_direction)
-            if note.getDuration() < (1/4):
-                self.insertFlag(matrix, row, column, harmony_note, stem_direction)
-        if harmony_note.getShift() != 0:
-                    self.insertShift(matrix, row, column, harmony_note)
+                stem_direction = "up"
+            if stem_direction == "down" and bottom + 3 >= len(matrix):
+                stem_direction = "up"
+            elif stem_direction == "up" and top - 3 < 0:
+                stem_direction = "down"
+            
+            #A chord reaching from the top to the bottom of the matrix has its
+            #stem cut short, and no flag
+            if stem_direction == "down":
+                stem_rows = range(top + 1, min(bottom + 4, len(matrix)))
+                end_row = bottom
+                flag_fits = bottom + 3 < len(matrix)
+            else:
+                stem_rows = range(max(top - 3, 0), bottom)
+                end_row = top
+                flag_fits = top - 3 >= 0
+            self.insertStem(matrix, stem_rows, rows, column, stem_direction)
+            if note.getDuration() < QUARTER and flag_fits:
+                self.insertFlag(matrix, end_row, column, note, stem_direction)
+        
+        #If a tone is sharp or flat, we insert the appropriate marking
+        for row, tone_shift in tones:
+            if tone_shift != 0:
+                self.insertShift(matrix, row, column, tone_shift)
     
     '''
                                 -fillRests-
         This function is used to fill unfilled bars with the appropriate rests.
+        The rests are added to the notes of the staff, whereas printStaff()
+        only draws them.
     '''
 
     def fillRests(self):
-        for bar in self.notes:
-            if self.addDurations(bar) < self.time:
-                
-                #First the bar (note array) is just appended with a rest of the
-                #exactly right length.
-                difference = self.time - self.addDurations(bar)
-                bar.append(Note(20, difference))
-                
-                #It is then modified into smaller notes that have writable 
-                #durations. For example 7/4 = 3/2 + 1/4
-                writable_notes = [1, 3/2, 3/4, 1/2, 3/8, 1/4, 1/8, 3/16, 1/16]
-                while difference not in writable_notes:
-                    for i in writable_notes:
-                        if i < difference:
-                            bar[-1].setDuration(i)
-                            difference -= i
-                            bar.append(Note(20, difference))
+        for barNo in range(len(self.notes)):
+            self.fillBar(barNo)
+    
+    '''
+                                -fillBar-
+        This function adds the rests that fill up a single bar to its notes,
+        so that the rests drawn by layoutBar() become real notes that can be
+        modified like any other.
+        
+        PARAMETERS:
+            -The index of the bar (starting from 0)
+    '''
+    
+    def fillBar(self, barNo):
+        bar = self.notes[barNo]
+        time = self.meters.barTime(barNo)
+        duration = self.addDurations(bar)
+        if duration < time:
+            for rest in self.splitRest(time - duration):
+                bar.append(Note(20, rest))
+            self.bar_durations[barNo] = time
+            self.markDirty(barNo)
+    
+    '''
+                                -splitRest-
+        This helper function splits the unfilled part of a bar into rests
+        that have writable durations, with as few rests as possible and the
+        longest ones first. For example 7/4 = 3/2 + 1/4. The splits are looked
+        up from a table shared by all bars (see ticks.py).
+        
+        PARAMETERS:
+            -The unfilled duration in ticks
+        
+        RETURNS:
+            -The durations of the rests, in order
+    '''
+    
+    def splitRest(self, difference):
+        return restDurations(difference)
                             
     '''
                                 -insertRest-
@@ -428,7 +1016,7 @@ class Staff(object):
         character matrix
         
         PARAMETERS:
-            - the character matrix as initialized by initilizeMatrix()
+            - the character matrix as initialized by initializeMatrix()
             - the column of the matrix that insertNotes() is currently going through
             - the Note object to be added
     '''
@@ -437,45 +1025,39 @@ class Staff(object):
         
         #Whole rests and half rests are similar to each other in design, 
         #so they are printed using a shared method
-        if note.getDuration() >= (1/2):
+        if note.getDuration() >= HALF:
             
             #A whole rest is above the middle line
-            if note.getDuration() >= 1:
+            if note.getDuration() >= WHOLE:
                 startrow = 6
             
             #A half rest is below the middle line
             else:
                 startrow = 4
                 
-            for col in range(column-2, column+1):
-                matrix[startrow][col] = "="
-                matrix[5][col] = "|"
+            matrix[startrow][column-2:column+1] = b"==="
+            matrix[5][column-2:column+1] = b"|||"
         
         #A quarter note is unique in design    
-        elif note.getDuration() >= (1/4):
-            matrix[4][column] = "/"
-            matrix[5][column] = "\\"
-            matrix[6][column] = "/"
-            matrix[7][column] = "\\"
+        elif note.getDuration() >= QUARTER:
+            matrix[4][column:column+1] = b"/"
+            matrix[5][column:column+1] = b"\\"
+            matrix[6][column:column+1] = b"/"
+            matrix[7][column:column+1] = b"\\"
         
         #All the rest below a quarter have a similar design
         else:
-            matrix[4][column-3] = "\\"
-            matrix[4][column-2] = "_"
-            matrix[4][column-1] = "_"
-            matrix[4][column] = "/"
-            matrix[5][column-1] = "/"
-            matrix[6][column-2] = "/"
+            matrix[4][column-3:column+1] = b"\\__/"
+            matrix[5][column-1:column] = b"/"
+            matrix[6][column-2:column-1] = b"/"
             
             #if the rest is even shorter than 1/8th, add an extra flag to the design 
-            if note.getDuration() <= (1/16):
-                matrix[5][column-2] = "_"
-                matrix[5][column-3] = "_"
-                matrix[5][column-4] = "\\"
+            if note.getDuration() <= SIXTEENTH:
+                matrix[5][column-4:column-1] = b"\\__"
         
         #if the rest is of a dotted length, add the dot
-        if note.getDuration() in [3/16, 3/8, 3/4, 3/2]:
-            matrix[4][column+1] = "."
+        if note.getDuration() in DOTTED:
+            matrix[4][column+1:column+2] = b"."
             
     '''
                                 -insertHead-
@@ -483,41 +1065,44 @@ class Staff(object):
         on the character matrix
         
         PARAMETERS:
-            - the character matrix as initialized by initilizeMatrix()
+            - the character matrix as initialized by initializeMatrix()
             - the row and column of the matrix that insertNotes() is currently going through
             - the Note object to be added
     '''
             
     def insertHead(self, matrix, row, column, note):
-        if note.getDuration() >= (1/2):
-            matrix[row][column-1] = "("
-            matrix[row][column] = ")"
+        if note.getDuration() >= HALF:
+            matrix[row][column-1:column+1] = b"()"
         else:
-            matrix[row][column-1] = "@"
-            matrix[row][column] = "@"
-        if note.getPitch() == 11:
-            matrix[row][column-2] = "-"
-            matrix[row][column+1] = "-"
-        if note.getDuration() in [3/16, 3/8, 3/4, 3/2]:
-            matrix[row][column+1] = "."
+            matrix[row][column-1:column+1] = b"@@"
+        if row == 11:
+            matrix[row][column-2:column-1] = b"-"
+            matrix[row][column+1:column+2] = b"-"
+        if note.getDuration() in DOTTED:
+            matrix[row][column+1:column+2] = b"."
             
     '''
                                 -insertStem-
-        This function is used by insertNotes() to insert the stem of a note 
-        on the character matrix
+        This function is used by insertChord() to insert the stem of a note 
+        on the character matrix. A downward stem is on the left side of the
+        heads, and an upward one on the right side.
         
         PARAMETERS:
-            - the character matrix as initialized by initilizeMatrix()
-            - the row and column of the matrix that insertNotes() is currently going through
-            - the Note object to be added
+            - the character matrix as initialized by initializeMatrix()
+            - the rows the stem runs through
+            - the rows of the heads of the chord, which the stem doesn't cover
+            - the column of the matrix that insertNotes() is currently going through
+            - the direction of the stem ("up" or "down")
     '''
     
-    def insertStem(self, matrix, row, column, note, stem_direction):
-        for i in range(1, 4):
+    def insertStem(self, matrix, stem_rows, head_rows, column, stem_direction):
+        for row in stem_rows:
+            if row in head_rows:
+                continue
             if stem_direction == "down":
-                matrix[row+i][column-1] = "|"
+                matrix[row][column-1:column] = b"|"
             else:
-                matrix[row-i][column] = "|"
+                matrix[row][column:column+1] = b"|"
     
     '''
                                 -insertFlag-
@@ -525,21 +1110,21 @@ class Staff(object):
         length shorter than 1/4 on the character matrix
         
         PARAMETERS:
-            - the character matrix as initialized by initilizeMatrix()
+            - the character matrix as initialized by initializeMatrix()
             - the row and column of the matrix that insertNotes() is currently going through
             - the Note object to be added
     '''
     
     def insertFlag(self, matrix, row, column, note, stem_direction):
         if stem_direction == "down":
-            matrix[row+3][column-2] = "\\"
+            matrix[row+3][column-2:column-1] = b"\\"
         else:
-            matrix[row-3][column+1] = "\\"
-        if note.getDuration() <= (1/16):
+            matrix[row-3][column+1:column+2] = b"\\"
+        if note.getDuration() <= SIXTEENTH:
             if stem_direction == "down":
-                matrix[row+2][column-2] = "\\"
+                matrix[row+2][column-2:column-1] = b"\\"
             else:
-                matrix[row-2][column+1] = "\\"
+                matrix[row-2][column+1:column+2] = b"\\"
             
     '''
                                 -insertShift-
@@ -547,31 +1132,38 @@ class Staff(object):
         sharp or a flat note.
         
         PARAMETERS:
-            - the character matrix as initialized by initilizeMatrix()
+            - the character matrix as initialized by initializeMatrix()
             - the row and column of the matrix that insertNotes() is currently going through
-            - the Note object which contains the pitch shift
+            - the pitch shift (1 for sharp, -1 for flat)
     '''
-    def insertShift(self, matrix, row, column, note):
-        if note.getShift() > 0:
-            matrix[row][column-3] = "#"
+    def insertShift(self, matrix, row, column, shift):
+        if shift > 0:
+            matrix[row][column-3:column-2] = b"#"
         else:
-            matrix[row][column-3] = "b"
+            matrix[row][column-3:column-2] = b"b"
             
     '''
                                 -reduceRests-
-        This function combines adjacent rests, and is used for clean-up before
-        printing the staff.
+        This function combines adjacent rests, and can be used for clean-up
+        after the rests have been filled in with fillRests(). Two rests are
+        only combined if the combined rest can be written as a single rest.
     '''
     
     def reduceRests(self):
-        for bar in self.notes:
-            for i in range(len(bar) - 1):
+        for barNo, bar in enumerate(self.notes):
+            #The bar gets shorter as rests are combined, so it is walked through
+            #with a while loop. A combined rest is compared to the next one again.
+            i = 0
+            while i < len(bar) - 1:
                 note  = bar[i]
                 next_note = bar[i + 1]
-                if note.getPitch() == 0 and next_note.getPitch() == 0:
+                if note.getPitch() == 20 and next_note.getPitch() == 20:
                     combined_duration = note.getDuration() + next_note.getDuration()
-                    if combined_duration <= 1:
+                    if combined_duration in WRITABLE:
                         note.setDuration(combined_duration)
-                        bar.remove(next_note)
+                        del bar[i + 1]
+                        self.markDirty(barNo)
+                        continue
+                i += 1
                 
                 
\ No newline at end of file
@@ -0,0 +1,128 @@
+'''
+@author: Timo Vehvilainen
+'''
+
+from fractions import Fraction
+
+'''
+    All durations and time signatures are stored as whole numbers of ticks, so
+    that the bar arithmetic is exact. A whole note is 96 ticks long, which puts
+    every note length from 1/32 (3 ticks) to 3/2 (144 ticks) on the grid, along
+    with the dotted lengths and the triplets down to 1/48 (2 ticks).
+'''
+
+TICKS_PER_WHOLE = 96
+
+WHOLE = TICKS_PER_WHOLE
+HALF = TICKS_PER_WHOLE // 2
+QUARTER = TICKS_PER_WHOLE // 4
+EIGHTH = TICKS_PER_WHOLE // 8
+SIXTEENTH = TICKS_PER_WHOLE // 16
+THIRTY_SECOND = TICKS_PER_WHOLE // 32
+
+#The dotted lengths 3/32, 3/16, 3/8, 3/4 and 3/2
+DOTTED = (3 * THIRTY_SECOND, 3 * SIXTEENTH, 3 * EIGHTH, 3 * QUARTER, 3 * HALF)
+
+'''
+                            -toTicks-
+    This function converts a duration or a time signature to ticks.
+
+    PARAMETERS:
+        -The duration as a string (either a quotient of the form "X/Y", or a
+            decimal number such as "0.25"), or as a number of whole notes
+
+    RETURNS:
+        -The duration as a whole number of ticks
+
+    RAISES:
+        -ValueError, if the string can't be read or the duration doesn't fall
+            on the tick grid
+'''
+
+def toTicks(duration):
+    if isinstance(duration, str):
+        if "/" in duration:
+            num, denom = duration.split("/")
+            duration = Fraction(num.strip()) / Fraction(denom.strip())
+        else:
+            duration = Fraction(duration.strip())
+    else:
+        duration = Fraction(duration)
+
+    ticks = duration * TICKS_PER_WHOLE
+    if ticks.denominator != 1:
+        raise ValueError("Duration %s is not a multiple of 1/%d" % (duration, TICKS_PER_WHOLE))
+    return int(ticks)
+
+'''
+                            -formatTicks-
+    This function converts a number of ticks back to the written form, such
+    as "1/4", "3/8" or "1" for a whole note.
+
+    PARAMETERS:
+        -The duration in ticks (an integer)
+
+    RETURNS:
+        -The duration as a string
+'''
+
+def formatTicks(ticks):
+    return str(Fraction(ticks, TICKS_PER_WHOLE))
+
+#The lengths that rests can be written with, the longest first
+WRITABLE = (3 * HALF, WHOLE, 3 * QUARTER, HALF, 3 * EIGHTH, QUARTER,
+            3 * SIXTEENTH, EIGHTH, 3 * THIRTY_SECOND, SIXTEENTH, THIRTY_SECOND)
+
+#The longest gap that the rest table is made for (eight whole notes)
+REST_TABLE_SIZE = 8 * WHOLE
+
+'''
+                            -buildRestTable-
+    This function works out how each gap on the tick grid, up to
+    REST_TABLE_SIZE, is filled with as few writable rests as possible.
+
+    Every writable length is a whole number of thirty-seconds, so a gap is
+    filled up to the last full thirty-second, and whatever is left (shorter
+    than a thirty-second) is given as a final rest of its own. When there are several
+    ways with as few rests, the one with the longest rests first is chosen.
+
+    RETURNS:
+        -A list with the rest durations of each gap as a tuple, longest first
+'''
+
+def buildRestTable():
+    table = [()] * (REST_TABLE_SIZE + 1)
+    for gap in range(THIRTY_SECOND, REST_TABLE_SIZE + 1, THIRTY_SECOND):
+        best = None
+        for duration in WRITABLE:
+            if duration <= gap:
+                rests = tuple(sorted((duration,) + table[gap - duration], reverse = True))
+                if best is None or len(rests) < len(best) or (len(rests) == len(best) and rests > best):
+                    best = rests
+        table[gap] = best
+
+    for gap in range(REST_TABLE_SIZE + 1):
+        remainder = gap % THIRTY_SECOND
+        if remainder != 0:
+            table[gap] = table[gap - remainder] + (remainder,)
+    return table
+
+REST_TABLE = buildRestTable()
+
+'''
+                            -restDurations-
+    This function gives the rests that fill a gap, from REST_TABLE. A gap
+    longer than the table is first filled with 3/2 rests.
+
+    PARAMETERS:
+        -The length of the gap in ticks
+
+    RETURNS:
+        -The durations of the rests as a tuple, longest first
+'''
+
+def restDurations(gap):
+    if gap <= REST_TABLE_SIZE:
+        return REST_TABLE[gap]
+    count = (gap - REST_TABLE_SIZE) // WRITABLE[0] + 1
+    return (WRITABLE[0],) * count + REST_TABLE[gap - count * WRITABLE[0]]
@@ -2,11 +2,32 @@
 @author: Timo Vehvilainen
 '''
 
+from __future__ import division
 import unittest
-from parse import Parse
+from parse import Parse, PITCH_TABLE, calculatePitch, calculateShift
 from staff import Staff
 from note import Note
 from corruptedFileError import CorruptedFileError
+from ticks import toTicks, formatTicks, TICKS_PER_WHOLE
+from glyphs import getGlyph
+from lineReader import LineReader
+from scoreIndex import openIndexed, saveIndexed, indexName
+from binaryScore import writeBinary, loadBinary
+from sheetWriter import writeSheet, writeScore
+from batch import renderFiles, renderOptions
+from renderCache import RenderCache, cacheKey
+from benchmark import generateScore, runBenchmarks, prepareCrowdedStaff, BENCHMARKS, CROWDED_BARS
+from instrumentation import Profile
+from score import Score
+from meterTable import MeterTable
+import io
+import os
+import tempfile
+import shutil
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
 
 class Test(unittest.TestCase):
@@ -52,7 +73,639 @@ class Test(unittest.TestCase):
         parse = Parse(sheet)
         parse.printStaff()
         sheet.close()
+    
+    def testAddNoteLayout(self):
+        staff = Staff("Layout", "Someone", 1, toTicks("3/4"))
+        for i in range(30):
+            staff.addNote(Note(i % 12, toTicks("1/4")))
+        staff.addNote(Note(3, toTicks(2)))
+        self.assertEqual(staff.length, 13)
+        self.assertEqual(staff.bar_durations, [staff.addDurations(bar) for bar in staff.notes])
+        for bar in staff.notes:
+            self.assertTrue(staff.addDurations(bar) <= staff.time)
+        self.assertEqual(staff.addDurations(staff.notes[-1]), toTicks("1/2"))
+    
+    def testExtendMatchesAddNote(self):
+        durations = [toTicks(d) for d in ["1/4", "1/2", "3/8", 1, "1/16", "3/2", "1/8", "3/4", 2]]
+        one_by_one = Staff("Layout", "Someone", 2, toTicks("3/4"))
+        for i, duration in enumerate(durations):
+            one_by_one.addNote(Note(i % 12, duration))
+        staff = Staff.fromNotes("Layout", "Someone", 2, toTicks("3/4"),
+                                (Note(i % 12, duration) for i, duration in enumerate(durations)))
+        self.assertEqual([[(n.getPitch(), n.getDuration()) for n in bar] for bar in staff.notes],
+                         [[(n.getPitch(), n.getDuration()) for n in bar] for bar in one_by_one.notes])
+    
+    def testTicks(self):
+        for text in ["1/16", "3/16", "1/8", "3/8", "1/4", "1/2", "3/4", "1", "3/2", "6/8", "0.25"]:
+            self.assertEqual(toTicks(formatTicks(toTicks(text))), toTicks(text))
+        self.assertEqual(formatTicks(toTicks("0.375")), "3/8")
+        self.assertRaises(ValueError, toTicks, "1/64")
+        
+        #Thirty-second notes are on the grid, and durations off it are reported
+        #as a faulty file
+        staff = Parse(StringIO("#SHEETMUSIC\n#NOTES\npitch : c1\nduration : 1/32\n"
+                               "pitch : d1\nduration : 3/32\n#END\n"), strict = True).staff
+        self.assertEqual([n.getDuration() for n in staff.notes[0]], [toTicks("1/32"), 3 * toTicks("1/32")])
+        self.assertEqual(staff.splitRest(toTicks("7/8")), (toTicks("3/4"), toTicks("1/8")))
+        self.assertRaises(CorruptedFileError, Parse,
+                          StringIO("#SHEETMUSIC\n#NOTES\npitch : c1\nduration : 1/64\n#END\n"), True)
+    
+    def testNoteStore(self):
+        sheet = open('data/harmony.txt', 'r')
+        parse = Parse(sheet)
+        sheet.close()
+        store = parse.staff.pack()
+        staff = Staff.fromStore(parse.staff.title, parse.staff.author, parse.staff.time, store)
+        self.assertFalse(staff.isBarLoaded(0))
+        self.assertEqual(staff.bar_durations, parse.staff.bar_durations)
+        for bar, packed_bar in zip(parse.staff.notes, staff.notes):
+            self.assertEqual([(n.getPitch(), n.getShift(), n.getDuration()) for n in bar],
+                             [(n.getPitch(), n.getShift(), n.getDuration()) for n in packed_bar])
+            self.assertEqual([n.getHarmony() != 0 and n.getHarmony().getPitch() for n in bar],
+                             [n.getHarmony() != 0 and n.getHarmony().getPitch() for n in packed_bar])
+        staff.notes[0][0].setPitch(5)
+        self.assertEqual(store.pitches[0], 5)
+        self.assertEqual(store.toNotes()[0][0].getPitch(), 5)
+        staff.printStaff(StringIO(), info_out = StringIO())
+        self.assertFalse(store.stale)
+        self.assertTrue(staff.pack() is store)
+        
+        #Moving the notes between the bars leaves the store behind
+        staff.notes[0][0].setDuration(toTicks("1"))
+        staff.reflowFrom(0)
+        self.assertTrue(store.stale)
+        self.assertRaises(ValueError, store.toNotes)
+        repacked = staff.pack()
+        self.assertFalse(repacked is store)
+        self.assertEqual([[n.getDuration() for n in bar] for bar in repacked.toNotes()],
+                         [[n.getDuration() for n in bar] for bar in staff.notes])
+    
+    def testOpenBarAfterEdit(self):
+        #A bar that a shorter note leaves room in gets the next added note
+        sheet = open('data/multiple_notes.txt', 'r')
+        parse = Parse(sheet)
+        sheet.close()
+        parse.modifyNote(1, 1, "c1", "1/4")
+        self.assertTrue(parse.staff.bar_durations[0] < parse.staff.barTime(0))
+        note = Note(4, toTicks("1/8"))
+        parse.staff.addNote(note)
+        self.assertTrue(parse.staff.notes[0][-1] is note)
+        
+        #So does a bar that a longer time signature leaves room in
+        parse.staff.fillRests()
+        parse.staff.addMeterChange(2, toTicks("3/2"))
+        note = Note(4, toTicks("1/8"))
+        parse.staff.addNote(note)
+        self.assertTrue(parse.staff.notes[2][-1] is note)
+    
+    def testEditRests(self):
+        #The rests that are only drawn can be selected and modified
+        sheet = open('data/empty.txt', 'r')
+        parse = Parse(sheet)
+        sheet.close()
+        self.assertEqual(len(parse.staff.notes[0]), 0)
+        self.assertEqual(len(parse.staff.layoutBar(0)), 1)
+        parse.modifyNote(1, 1, "c1", "1/4")
+        self.assertEqual([(n.getPitch(), n.getDuration()) for n in parse.staff.notes[0]],
+                         [(parse.convertPitch("c1"), toTicks("1/4"))])
+        self.assertEqual(parse.staff.bar_durations[0], toTicks("1/4"))
         
+        #So can the rests after the notes of a partly filled bar
+        parse.modifyNote(1, 2, "e1", "1/8")
+        self.assertEqual([n.getDuration() for n in parse.staff.notes[0]], [toTicks("1/4"), toTicks("1/8")])
+        parse.addHarmony(1, 2, "g1")
+        self.assertEqual(parse.staff.notes[0][1].getChord(), ((parse.convertPitch("g1"), 0),))
+        self.assertEqual(sum(parse.staff.bar_durations), toTicks("3/8"))
+    
+    def testRenderCache(self):
+        sheet = open('data/multiple_notes.txt', 'r')
+        parse = Parse(sheet)
+        sheet.close()
+        parse.printStaff(StringIO())
+        parse.modifyNote(2, 1, "c2", "1/8")
+        self.assertTrue(1 not in parse.staff.bar_cache)
+        self.assertTrue(0 in parse.staff.bar_cache)
+        cached = StringIO()
+        parse.printStaff(cached)
+        parse.staff.markAllDirty()
+        fresh = StringIO()
+        parse.printStaff(fresh)
+        self.assertEqual(cached.getvalue(), fresh.getvalue())
+        
+        #The lyrics under the cached bars are kept too
+        sheet = open('data/lyrics.txt', 'r')
+        parse = Parse(sheet)
+        sheet.close()
+        parse.printStaff(StringIO())
+        self.assertEqual(sorted(parse.staff.lyrics_cache), sorted(parse.staff.bar_cache))
+        parse.modifyNote(1, 1, "c1", "1/8")
+        self.assertTrue(0 not in parse.staff.lyrics_cache)
+        cached = StringIO()
+        parse.printStaff(cached)
+        parse.staff.markAllDirty()
+        fresh = StringIO()
+        parse.printStaff(fresh)
+        self.assertEqual(cached.getvalue(), fresh.getvalue())
+    
+    def testPrintDoesNotModify(self):
+        staff = Staff("Pure", "Someone", 1, toTicks("3/4"))
+        staff.extend([Note(3, toTicks("1/4"), 0, 1), Note(3, toTicks("1/8"))])
+        before = [[(n.getPitch(), n.getDuration(), n.getShift()) for n in bar] for bar in staff.notes]
+        first = StringIO()
+        staff.printStaff(first)
+        staff.markAllDirty()
+        second = StringIO()
+        staff.printStaff(second)
+        self.assertEqual(first.getvalue(), second.getvalue())
+        self.assertEqual(before, [[(n.getPitch(), n.getDuration(), n.getShift()) for n in bar] for bar in staff.notes])
+        self.assertEqual([shift for note, shift, chord_shifts in staff.layoutBar(0)], [1, 1, 0])
+    
+    def testGlyphs(self):
+        cleff = getGlyph("G-cleff")
+        self.assertTrue(cleff is getGlyph("G-cleff"))
+        self.assertEqual(cleff[1], "----/ \\----")
+    
+    def testWrappedSystems(self):
+        sheet = open('data/lyrics.txt', 'r')
+        parse = Parse(sheet)
+        sheet.close()
+        systems = list(parse.staff.renderSystems(4, False))
+        self.assertEqual(len(systems), 2)
+        self.assertEqual(parse.staff.bar_cache, {})
+        self.assertTrue("na-" in systems[0] and "ni" in systems[0])
+        self.assertEqual(systems[1].split("\n")[-1].strip(), "")
+        whole = StringIO()
+        parse.printStaff(whole)
+        self.assertEqual(list(parse.staff.renderSystems()), [whole.getvalue()])
+    
+    def testLineReader(self):
+        sheet = open('data/lyrics.txt', 'r')
+        expected = [line.strip() for line in sheet if line.strip() != ""]
+        sheet.seek(0)
+        reader = LineReader(sheet, 7)
+        lines = []
+        line = reader.nextLine()
+        while line != "":
+            lines.append(line)
+            line = reader.nextLine()
+        sheet.close()
+        self.assertEqual(lines, expected)
+    
+    def testPitchTables(self):
+        sheet = open('data/empty.txt', 'r')
+        parse = Parse(sheet)
+        sheet.close()
+        for name in list(PITCH_TABLE) + ["C#2", "h", "0"]:
+            self.assertEqual(parse.convertPitch(name), calculatePitch(name))
+            self.assertEqual(parse.convertShift(name), calculateShift(name))
+        self.assertEqual(parse.convertPitch("cb1"), 11)
+        self.assertEqual(parse.convertShift("g#2"), 1)
+        self.assertEqual(parse.convertTime("3/8"), toTicks("3/8"))
+        self.assertRaises(ValueError, parse.convertTime, "1/7")
+    
+    def testBinaryScore(self):
+        sheet = open('data/lyrics.txt', 'r')
+        parse = Parse(sheet)
+        sheet.close()
+        handle, filename = tempfile.mkstemp()
+        out = os.fdopen(handle, "wb")
+        writeBinary(parse.staff, out)
+        out.close()
+        try:
+            staff = loadBinary(filename)
+            self.assertEqual(staff.length, parse.staff.length)
+            self.assertFalse(staff.notes.isLoaded(1))
+            self.assertEqual([(n.getPitch(), n.getShift(), n.getDuration()) for n in staff.notes[1]],
+                             [(n.getPitch(), n.getShift(), n.getDuration()) for n in parse.staff.notes[1]])
+            self.assertFalse(staff.notes.isLoaded(0))
+            self.assertEqual(staff.lyrics, parse.staff.lyrics)
+            
+            text = StringIO()
+            writeSheet(staff, text)
+            text.seek(0)
+            self.assertEqual([[(n.getPitch(), n.getDuration()) for n in bar] for bar in Parse(text).staff.notes],
+                             [[(n.getPitch(), n.getDuration()) for n in bar] for bar in parse.staff.notes])
+        finally:
+            os.remove(filename)
+            
+    def testIndexedScore(self):
+        folder = tempfile.mkdtemp()
+        filename = os.path.join(folder, "score.txt")
+        shutil.copy('data/multiple_notes.txt', filename)
+        try:
+            staff = openIndexed(filename)
+            self.assertTrue(os.path.exists(indexName(filename)))
+            self.assertFalse(any(staff.isBarLoaded(barNo) for barNo in range(staff.length)))
+            
+            #Modifying a note only reads the bar it is in
+            parse = Parse.fromStaff(staff)
+            parse.modifyNote(3, 3, "a1", "1/4")
+            self.assertEqual([barNo for barNo in range(staff.length) if staff.isBarLoaded(barNo)], [2])
+            
+            saveIndexed(staff, filename)
+            staff = openIndexed(filename)
+            self.assertEqual([[(n.getPitch(), n.getDuration()) for n in bar] for bar in staff.notes],
+                             [[(pitch, toTicks(duration)) for pitch, duration in bar] for bar in
+                              [[(0, "3/4")], [(0, "1/4"), (7, "1/8"), (2, "3/8")],
+                               [(2, "1/8"), (4, "1/8"), (6, "1/4"), (8, "1/4")], [(8, "3/4")], [], []]])
+            
+            #The saved score file gives the same staff when parsed again
+            sheet = open(filename, 'r')
+            parsed = Parse(sheet)
+            sheet.close()
+            self.assertEqual([[(n.getPitch(), n.getDuration()) for n in bar] for bar in parsed.staff.notes],
+                             [[(n.getPitch(), n.getDuration()) for n in bar] for bar in staff.notes])
+            
+            #An index that can't be read (for example, one written by another
+            #version) is built again
+            index = open(indexName(filename), "wb")
+            index.write(b"SMSB\x01\x00")
+            index.close()
+            self.assertEqual(len(openIndexed(filename).notes), len(staff.notes))
+            
+            #Text that isn't ASCII is printed the same way as when parsed
+            sheet = io.open(filename, 'w', encoding = 'utf-8')
+            sheet.write(u"#SHEETMUSIC\n#SONG INFO\ntitle : \u00c4\u00e4net\nauthor : J\u00f6rg\n"
+                        u"#TIME\nsignature : 3/4\n#NOTES\npitch : c1\nduration : 3/4\n"
+                        u"#LYRICS\ny\u00f6\n#END\n")
+            sheet.close()
+            outputs = []
+            for opened in [openIndexed(filename), Parse(open(filename, 'r')).staff]:
+                printed = os.path.join(folder, "printed.txt")
+                out = open(printed, 'w')
+                opened.printStaff(out, info_out = out)
+                out.close()
+                outputs.append(io.open(printed, 'r', encoding = 'utf-8').read())
+            self.assertIn(u"\u00c4\u00e4net", outputs[0])
+            self.assertIn(u"y\u00f6", outputs[0])
+            self.assertEqual(outputs[0], outputs[1])
+        finally:
+            shutil.rmtree(folder)
+            
+    def testBatchRender(self):
+        folder = tempfile.mkdtemp()
+        try:
+            report = StringIO()
+            failures = renderFiles(['data/lyrics.txt', 'data/G-cleff.txt', 'data/harmony.txt'],
+                                   folder, jobs = 2, report = report)
+            self.assertEqual(failures, 1)
+            self.assertIn("data/G-cleff.txt: Corrupted file error", report.getvalue())
+            self.assertEqual(sorted(os.listdir(folder)), ['harmony.render.txt', 'lyrics.render.txt'])
+            
+            rendered = open(os.path.join(folder, 'lyrics.render.txt'), 'r').read()
+            self.assertTrue(rendered.startswith("Title: Lyrics\n"))
+            
+            #Inputs are never overwritten, and clashing outputs are reported
+            other = os.path.join(folder, 'other')
+            os.mkdir(other)
+            shutil.copy('data/lyrics.txt', os.path.join(other, 'lyrics.txt'))
+            shutil.copy('data/harmony.txt', os.path.join(other, 'harmony.render.txt'))
+            report = StringIO()
+            failures = renderFiles(['data/lyrics.txt', os.path.join(other, 'lyrics.txt'),
+                                    os.path.join(other, 'harmony.render.txt'), 'data/harmony.txt'],
+                                   other, report = report)
+            self.assertEqual(failures, 2)
+            self.assertIn("is already written for data/lyrics.txt", report.getvalue())
+            self.assertIn("would overwrite an input file", report.getvalue())
+            self.assertEqual(open(os.path.join(other, 'harmony.render.txt'), 'r').read(),
+                             open('data/harmony.txt', 'r').read())
+        finally:
+            shutil.rmtree(folder)
+            
+    def testBatchRenderCache(self):
+        folder = tempfile.mkdtemp()
+        cache_dir = os.path.join(folder, 'cache')
+        try:
+            for expected in ["0 hits, 2 misses", "2 hits, 0 misses"]:
+                report = StringIO()
+                renderFiles(['data/lyrics.txt', 'data/harmony.txt'], folder, report = report,
+                            cache_dir = cache_dir)
+                self.assertIn(expected, report.getvalue())
+            
+            #Different options don't use the same entry
+            cache = RenderCache(cache_dir)
+            self.assertNotEqual(cacheKey('data/lyrics.txt', renderOptions(None)),
+                                cacheKey('data/lyrics.txt', renderOptions(2)))
+            
+            #The least recently used entry is removed when the cache is full
+            used = cacheKey('data/lyrics.txt', renderOptions(None))
+            os.utime(cache.entryName(used), (0, 0))
+            self.assertIsNotNone(cache.get(used))
+            cache.max_size = os.path.getsize(cache.entryName(used))
+            cache.put("new", "")
+            self.assertEqual(len(os.listdir(cache_dir)), 3)
+            cache.evict()
+            self.assertEqual(sorted(os.listdir(cache_dir)), [used + ".render", "new.render"])
+            
+            #A batch trims the cache once all the files are rendered
+            renderFiles(['data/lyrics.txt', 'data/harmony.txt'], folder, report = StringIO(),
+                        cache_dir = cache_dir, cache_size = 0)
+            self.assertEqual([name for name in os.listdir(cache_dir) if os.path.getsize(os.path.join(cache_dir, name)) > 0], [])
+        finally:
+            shutil.rmtree(folder)
+            
+    def testBenchmark(self):
+        text = generateScore(200, signature = "6/8")
+        self.assertEqual(text, generateScore(200, signature = "6/8"))
+        staff = Parse(StringIO(text), strict = True).staff
+        self.assertEqual(staff.time, toTicks("6/8"))
+        self.assertTrue(sum(len(bar) for bar in staff.notes) >= 200)
+        self.assertTrue(len(staff.lyrics) > 0)
+        
+        #straightenStaff() is timed on a staff that isn't straight yet
+        crowded = prepareCrowdedStaff(text)
+        self.assertEqual(len(crowded.notes), CROWDED_BARS)
+        self.assertTrue(max(crowded.bar_durations) > crowded.time)
+        crowded.straightenStaff()
+        self.assertTrue(max(crowded.bar_durations) <= crowded.time)
+        
+        results = runBenchmarks([10], ["3/4"], repeat = 1, measure_memory = False)
+        self.assertEqual([result["benchmark"] for result in results], [benchmark[0] for benchmark in BENCHMARKS])
+
+            
+    def testProfile(self):
+        original = Staff.__dict__["insertNotes"]
+        with Profile() as profile:
+            sheet = open('data/lyrics.txt', 'r')
+            parse = Parse(sheet)
+            sheet.close()
+            parse.staff.printStaff(StringIO(), info_out = StringIO())
+            bars = len(parse.staff.notes)
+            parse.staff.addNote(Note(3, toTicks("1/4")))
+            parse.modifyNote(1, 1, "c1", "1/8")
+        self.assertIs(Staff.__dict__["insertNotes"], original)
+        
+        self.assertEqual(profile.stats["Parse.handleNotes"][0], 1)
+        self.assertEqual(profile.stats["Staff.insertNotes"][0], bars)
+        self.assertEqual(profile.stats["Staff.renderBar"][0], bars)
+        self.assertTrue(profile.stats["Staff.layoutBar"][0] >= bars)
+        self.assertEqual(profile.stats["Staff.addNote"][0], 1)
+        self.assertEqual(profile.stats["Staff.extend"][0], 2)
+        self.assertTrue(profile.stats["Staff.reflow"][0] > 1)
+        self.assertEqual(profile.stats["Staff.reflowFrom"][0], 1)
+        self.assertEqual(profile.stats["Staff.fillRests"][0], 0)
+        
+        report = StringIO()
+        profile.report(report)
+        self.assertIn("Staff.insertNotes", report.getvalue())
+        self.assertNotIn("Staff.fillRests", report.getvalue())
+            
+    def testReduceRests(self):
+        #Adjacent rests are combined only into rests that can be written
+        durations = ["1/8", "1/8", "1/4", "1/8", "1/2"]
+        bar = [Note(20, toTicks(duration)) for duration in durations] + [Note(3, toTicks("1/8"))]
+        staff = Staff.fromBars("Title", "Author", toTicks("3/2"), [bar], [toTicks("3/2")])
+        staff.reduceRests()
+        self.assertEqual([(n.getPitch(), formatTicks(n.getDuration())) for n in staff.notes[0]],
+                         [(20, "1/2"), (20, "1/8"), (20, "1/2"), (3, "1/8")])
+    
+    def testReflow(self):
+        #A note four bars long and overly full bars are straightened in one pass
+        quarter = toTicks("1/4")
+        bars = [[Note(1, 16 * quarter)], [Note(2, quarter), Note(3, 2 * quarter)], [Note(4, 3 * quarter), Note(5, 2 * quarter)]]
+        staff = Staff.fromBars("Title", "Author", 3 * quarter, bars, [0, 0, 0])
+        staff.straightenStaff()
+        self.assertEqual([[(n.getPitch(), n.getDuration() // quarter) for n in bar] for bar in staff.notes],
+                         [[(1, 3)], [(1, 3)], [(1, 3)], [(1, 3)], [(1, 3)], [(1, 1), (2, 1), (3, 1)],
+                          [(3, 1), (4, 2)], [(4, 1), (5, 2)]])
+        self.assertEqual(staff.bar_durations, [3 * quarter] * 8)
+        
+        #The reflow can be started again from an edited bar
+        staff.notes[6][1].setDuration(4 * quarter)
+        staff.bar_durations[6] = 5 * quarter
+        staff.reflow(6)
+        self.assertEqual([[(n.getPitch(), n.getDuration() // quarter) for n in bar] for bar in staff.notes[6:]],
+                         [[(3, 1), (4, 2)], [(4, 2), (4, 1)], [(5, 2)]])
+        self.assertEqual(staff.length, 9)
+            
+    def testLocalReflow(self):
+        #Every bar has room for another quarter note
+        quarter = toTicks("1/4")
+        bars = [[Note(1, quarter), Note(2, quarter)] for i in range(1000)]
+        parse = Parse.fromStaff(Staff.fromBars("Title", "Author", 3 * quarter, bars, [2 * quarter] * 1000))
+        parse.staff.printStaff(StringIO(), info_out = StringIO())
+        
+        #Lengthening a note only touches the bars it spills over into
+        parse.modifyNote(800, 2, "c2", "3/4")
+        self.assertEqual(sorted(set(range(1000)) - set(parse.staff.bar_cache)), [799, 800])
+        self.assertEqual([(n.getPitch(), n.getDuration()) for n in parse.staff.notes[800]],
+                         [(4, quarter), (1, quarter), (2, quarter)])
+        
+        #The result is the same as straightening the whole staff
+        notes = [[(n.getPitch(), n.getDuration()) for n in bar] for bar in parse.staff.notes]
+        parse.staff.straightenStaff()
+        self.assertEqual([[(n.getPitch(), n.getDuration()) for n in bar] for bar in parse.staff.notes], notes)
+
+            
+    def testRestTable(self):
+        staff = Staff("Title", "Author", 4, toTicks("1"))
+        #The gaps are split into as few rests as possible, the longest first
+        self.assertEqual(staff.splitRest(toTicks("5/4")), (toTicks("1"), toTicks("1/4")))
+        self.assertEqual(staff.splitRest(toTicks("15/16")), (toTicks("3/4"), toTicks("3/16")))
+        self.assertEqual(staff.splitRest(toTicks("7/4")), (toTicks("3/2"), toTicks("1/4")))
+        self.assertEqual(staff.splitRest(toTicks("1/12")), (toTicks("1/16"), toTicks("1/48")))
+        for gap in range(1, 20 * TICKS_PER_WHOLE):
+            rests = staff.splitRest(gap)
+            self.assertEqual(sum(rests), gap)
+            self.assertEqual(list(rests), sorted(rests, reverse = True))
+        
+        staff.addNote(Note(3, toTicks("1/16")))
+        staff.fillRests()
+        self.assertEqual([n.getDuration() for n in staff.notes[0]], [toTicks("1/16"), toTicks("3/4"), toTicks("3/16")])
+            
+    def testAccidentals(self):
+        eighth = toTicks("1/8")
+        staff = Staff("Title", "Author", 4, toTicks("1"))
+        staff.extend([Note(3, eighth), Note(3, eighth, 0, 1), Note(3, eighth), Note(5, eighth, Note(3, eighth, 0, -1)),
+                      Note(3, eighth), Note(20, eighth), Note(4, eighth), Note(4, eighth, Note(5, eighth))])
+        layout = staff.layoutBar(0)
+        
+        #A sharp or a flat carries forward to the later notes of the same pitch,
+        #harmonies included, until it is replaced by another one
+        self.assertEqual([shift for note, shift, chord_shifts in layout], [0, 1, 1, 0, -1, 0, 0, 0])
+        self.assertEqual([chord_shifts for note, shift, chord_shifts in layout], [(), (), (), (-1,), (), (), (), (0,)])
+        
+        #The notes themselves keep their own shifts
+        self.assertEqual([note.getShift() for note in staff.notes[0]], [0, 1, 0, 0, 0, 0, 0, 0])
+            
+    def testChords(self):
+        text = ("#SHEETMUSIC\n#TIME\nsignature : 1/2\n#NOTES\n"
+                "pitch : e1\nduration : 3/4\nharmony : c2\nharmony : g1\nharmony : c#1\n"
+                "pitch : d2\nduration : 1/4\n#END\n")
+        staff = Parse(StringIO(text), strict = True).staff
+        
+        #The tones are sorted, and the chord is kept when the note is split
+        chord = ((4, 0), (7, 0), (11, 1))
+        self.assertEqual([(n.getPitch(), n.getDuration(), n.getChord()) for bar in staff.notes for n in bar],
+                         [(9, toTicks("1/2"), chord), (9, toTicks("1/4"), chord), (3, toTicks("1/4"), ())])
+        
+        #Every tone of the chord is drawn in the same column, sharing one stem
+        rows = staff.renderBar(0)
+        self.assertEqual([row[3:5] for row in rows[1:12]],
+                         [b"-|", b" |", b"-|", b"()", b"-|", b" |", b"()", b" |", b"()", b" |", b"()"])
+        self.assertEqual(rows[11][1:2], b"#")
+        
+        #Harmonies can be added one tone at a time
+        parse = Parse.fromStaff(staff)
+        parse.addHarmony(2, 2, "f2")
+        parse.addHarmony(2, 2, "a1")
+        self.assertEqual(staff.notes[1][1].getChord(), ((1, 0), (6, 0)))
+        
+        #The chords are kept in all the other formats
+        notes = [[(n.getPitch(), n.getDuration(), n.getChord()) for n in bar] for bar in staff.notes]
+        packed = Staff.fromStore(staff.title, staff.author, staff.time, staff.pack())
+        self.assertEqual([[(n.getPitch(), n.getDuration(), n.getChord()) for n in bar] for bar in packed.notes], notes)
+        sheet = StringIO()
+        writeSheet(staff, sheet)
+        sheet.seek(0)
+        self.assertEqual([[(n.getPitch(), n.getDuration(), n.getChord()) for n in bar]
+                          for bar in Parse(sheet).staff.notes][:2], notes[:2])
+        handle, filename = tempfile.mkstemp()
+        out = os.fdopen(handle, "wb")
+        writeBinary(staff, out)
+        out.close()
+        try:
+            loaded = loadBinary(filename)
+            self.assertEqual([[(n.getPitch(), n.getDuration(), n.getChord()) for n in bar] for bar in loaded.notes], notes)
+        finally:
+            os.remove(filename)        
+    
+    def testScore(self):
+        sheet = open('data/duet.txt', 'r')
+        parse = Parse(sheet, strict = True)
+        sheet.close()
+        score = parse.score
+        
+        #Each #NOTES section is a part, sharing the song info and the time
+        self.assertEqual(len(score.parts), 2)
+        self.assertTrue(parse.staff is score.parts[0])
+        for part in score.parts:
+            self.assertEqual((part.title, part.time), ("Duet", toTicks("3/4")))
+        self.assertEqual(len(score.parts[0].lyrics), 4)
+        self.assertEqual(score.parts[1].lyrics, [[]])
+        
+        #The bar lines of the stacked parts line up
+        out = StringIO()
+        score.printScore(out, info_out = StringIO())
+        rows = out.getvalue().split("\n")
+        bar_lines = lambda rows: [i for i in range(len(rows[0])) if all([row[i] == "|" for row in rows])]
+        self.assertEqual(bar_lines(rows[1:10]), [11, 41, 56])
+        self.assertEqual(bar_lines(rows[15:24]), [11, 41, 56])
+        
+        #A shorter time signature lays out every part again, without adding
+        #rests to them
+        copy = Parse(StringIO(self.scoreText(score)), strict = True)
+        copy.editInfo("Duet", "Two Voices", "1/2", 2)
+        for part, total in zip(copy.score.parts, ["3/2", "5/4"]):
+            self.assertTrue(all([duration <= toTicks("1/2") for duration in part.bar_durations]))
+            self.assertEqual(sum(part.bar_durations), toTicks(total))
+            self.assertEqual([n for bar in part.notes for n in bar if n.getPitch() == 20], [])
+        
+        #A score with a single part is printed just like its staff
+        staff = Parse(open('data/lyrics.txt', 'r')).staff
+        out = StringIO()
+        staff.printStaff(out, info_out = out)
+        single = StringIO()
+        Score.fromParts([staff]).printScore(single, info_out = single)
+        self.assertEqual(single.getvalue(), out.getvalue())
+    
+    def testMeterChanges(self):
+        meters = MeterTable(toTicks("4/4"))
+        meters.addChange(3, toTicks("4/4"))
+        meters.addChange(1, toTicks("3/4"))
+        meters.addChange(3, toTicks("2/4"))
+        self.assertEqual(meters.laterChanges(), [(1, toTicks("3/4")), (3, toTicks("2/4"))])
+        self.assertEqual([meters.barTime(barNo) for barNo in range(6)],
+                         [toTicks(text) for text in ["4/4", "3/4", "3/4", "2/4", "2/4", "2/4"]])
+        self.assertEqual([meters.barStart(barNo) for barNo in range(6)],
+                         [toTicks(text) for text in ["0", "1", "7/4", "5/2", "3", "7/2"]])
+        
+        #A change to the time signature in effect is kept, but left out
+        meters = MeterTable(toTicks("4/4"))
+        meters.addChange(4, toTicks("3/4"))
+        meters.setTime(toTicks("3/4"))
+        self.assertEqual(meters.laterChanges(), [(4, toTicks("3/4"))])
+        self.assertEqual(meters.effectiveChanges(), [])
+        self.assertEqual(meters.barStart(5), 5 * toTicks("3/4"))
+        meters.setTime(toTicks("4/4"))
+        self.assertEqual(meters.effectiveChanges(), [(4, toTicks("3/4"))])
+        self.assertEqual(meters.barTime(3), toTicks("4/4"))
+        self.assertEqual(meters.barTime(4), toTicks("3/4"))
+        
+        #Each bar is filled up to the time signature in effect in it
+        text = ("#SHEETMUSIC\n#TIME\nsignature : 4/4\nsignature : 3/4 @ bar 2\nsignature : 2/4 @ bar 4\n"
+                "#NOTES\n" + "pitch : c1\nduration : 1/2\n" * 6 + "pitch : e1\nduration : 1/8\n#END\n")
+        staff = Parse(StringIO(text), strict = True).staff
+        self.assertEqual(staff.bar_durations, [toTicks(text) for text in ["1", "3/4", "3/4", "1/2", "1/8"]])
+        self.assertEqual([[n.getDuration() for n in bar] for bar in staff.notes][1:3],
+                         [[toTicks("1/2"), toTicks("1/4")], [toTicks("1/4"), toTicks("1/2")]])
+        staff.fillRests()
+        self.assertEqual(staff.bar_durations, [toTicks(text) for text in ["1", "3/4", "3/4", "1/2", "1/2"]])
+        
+        #The changes are kept when the staff is saved
+        sheet = StringIO()
+        writeSheet(staff, sheet)
+        self.assertTrue("signature : 1/2 @ bar 4\n" in sheet.getvalue())
+        sheet.seek(0)
+        self.assertEqual(Parse(sheet, strict = True).staff.meters.changes, staff.meters.changes)
+        handle, filename = tempfile.mkstemp()
+        out = os.fdopen(handle, "wb")
+        writeBinary(staff, out)
+        out.close()
+        try:
+            self.assertEqual(loadBinary(filename).meters.changes, staff.meters.changes)
+        finally:
+            os.remove(filename)
+        
+        self.assertRaises(CorruptedFileError, Parse,
+                          StringIO("#SHEETMUSIC\n#TIME\nsignature : 3/4 @ 2\n#END\n"), True)
+    
+    def testOnsetIndex(self):
+        text = generateScore(300, signature = "3/4", seed = 3).replace(
+            "signature : 3/4\n", "signature : 3/4\nsignature : 5/4 @ bar 7\nsignature : 1/2 @ bar 20\n")
+        parse = Parse(StringIO(text), strict = True)
+        staff = parse.staff
+        index = staff.onset_index
+        
+        #Every tick is compared with walking through the notes from the start
+        def walk():
+            sounding = {}
+            for barNo, bar in enumerate(staff.notes):
+                tick = staff.meters.barStart(barNo)
+                for noteNo, note in enumerate(bar):
+                    for t in range(tick, tick + note.getDuration()):
+                        sounding[t] = (barNo, noteNo)
+                    tick += note.getDuration()
+            return sounding
+        sounding = walk()
+        end = staff.meters.barStart(len(staff.notes)) + 12
+        self.assertEqual([index.locate(t) for t in range(-1, end)],
+                         [sounding.get(t) for t in range(-1, end)])
+        self.assertTrue(index.noteAt(staff.meters.barStart(6)) is staff.notes[6][0])
+        
+        for start, stop in [(0, 1), (30, 100), (250, 251), (400, 1500), (0, end)]:
+            expected = sorted(set([sounding[t] for t in range(start, stop) if t in sounding]))
+            self.assertEqual([(barNo, noteNo) for onset, barNo, noteNo in index.notesBetween(start, stop)],
+                             expected)
+            for onset, barNo, noteNo in index.notesBetween(start, stop):
+                self.assertEqual(onset, index.onset(barNo, noteNo))
+        
+        #Straightening a straight staff keeps the whole index
+        indexed = len(index.bar_onsets)
+        staff.straightenStaff()
+        self.assertEqual(len(index.bar_onsets), indexed)
+        
+        #After an edit only the changed bars are indexed again
+        parse.modifyNote(4, 1, "c1", "3/2")
+        self.assertTrue(3 not in index.bar_onsets and 2 in index.bar_onsets)
+        sounding = walk()
+        end = staff.meters.barStart(len(staff.notes))
+        self.assertEqual([index.locate(t) for t in range(end)], [sounding.get(t) for t in range(end)])
+    
+    def scoreText(self, score):
+        out = StringIO()
+        writeScore(score, out)
+        return out.getvalue()
 
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']